@@ -190,8 +190,7 @@ if PREDICTOR_DISPONIBLE:
 # EXTRAER DATOS DE FLORES CHIBCHA
 # ============================================================
 if resultado and "predicciones_estaciones" in resultado:
-    flores_data = next((p for p in resultado['predicciones_estaciones'] 
-                       if p['codigo'] == '21205880'), None)
+    flores_data = resultado['predicciones_por_codigo'].get('21205880')
     
     if flores_data:
         temp_predicha = flores_data['temperatura_predicha']
@@ -503,8 +502,7 @@ if resultado and "predicciones_estaciones" in resultado:
                     
                     if punto_dentro_poligono(lat_click, lon_click, poligono_madrid):
                         # Interpolación directa
-                        temp_interpolada = predictor.interpolar_idw(lat_click, lon_click, predicciones_validas)
-                        prob_interpolada = predictor.interpolar_probabilidad_helada(lat_click, lon_click, predicciones_validas)
+                        temp_interpolada, prob_interpolada = predictor.interpolar(lat_click, lon_click, predicciones_validas)
                         
                         if temp_interpolada is not None:
                             if temp_interpolada <= -2:
@@ -1,12 +1,226 @@
 # predictor_multiestacion.py
 # VERSIÓN HÍBRIDA CON COORDENADAS DESDE CSV Y CACHÉ
 
+import logging
 import pandas as pd
 import numpy as np
 import joblib
+from joblib import Parallel, delayed
+import time
+from functools import lru_cache
+from scipy.special import expit
+from sklearn.linear_model import LinearRegression, LogisticRegression, Ridge, RidgeClassifier
+from sklearn.preprocessing import StandardScaler
 from pathlib import Path
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _fecha_hoy(minuto):
+    """Fecha de hoy normalizada, recalculada como máximo una vez por minuto"""
+    return pd.Timestamp.now().normalize()
+
+
+def _normalizar_fecha(fecha):
+    """Convierte una fecha de consulta a Timestamp normalizado (sin hora)"""
+    return pd.to_datetime(fecha).normalize()
+
+
+# Estación con modelo dedicado (Flores Chibcha)
+CODIGO_MADRID = "21205880"
+
+# Filas de historia necesarias para los features del último día:
+# rezago máximo (30) + ventana máxima sobre la serie desplazada (30 + 1), con margen
+FILAS_FEATURES = 64
+
+# Límites superiores (inclusive) de temperatura para cada nivel de riesgo
+LIMITES_RIESGO = np.array([-2, 0, 2, 4])
+NIVELES_RIESGO = (
+    ("MUY ALTO", "🔴", "red"),
+    ("ALTO", "🟠", "orange"),
+    ("MEDIO", "🟡", "yellow"),
+    ("BAJO", "🟢", "lightblue"),
+    ("MUY BAJO", "🟢", "green"),
+)
+
+
+def _tabla_ciclica(periodo, maximo):
+    """Seno y coseno de 2π·k/periodo para k = 0..maximo"""
+    angulo = 2 * np.pi * np.arange(maximo + 1) / periodo
+    return np.sin(angulo), np.cos(angulo)
+
+
+# Tablas de features cíclicos indexadas por el valor de calendario (periodo, valor máximo)
+TABLAS_CICLICAS = {
+    nombre: _tabla_ciclica(periodo, maximo)
+    for nombre, (periodo, maximo) in {
+        'Mes': (12, 12),
+        'DíaAño': (365, 366),
+        'Semana': (52, 53),
+        'DiaSemana': (7, 6),
+    }.items()
+}
+
+
+def _features_ciclicos(nuevas):
+    """Agrega <nombre>_sin/<nombre>_cos consultando las tablas en lugar de evaluar sin/cos por fila"""
+    for nombre, (tabla_sin, tabla_cos) in TABLAS_CICLICAS.items():
+        idx = np.asarray(nuevas[nombre], dtype=np.intp)
+        nuevas[f'{nombre}_sin'] = tabla_sin[idx]
+        nuevas[f'{nombre}_cos'] = tabla_cos[idx]
+
+
+def _desplazar(valores, pasos):
+    """Equivalente a Series.shift(pasos) sobre un array de NumPy"""
+    salida = np.full(len(valores), np.nan)
+    if pasos < len(valores):
+        salida[pasos:] = valores[:len(valores) - pasos]
+    return salida
+
+
+def _rellenar_inicio(valores, n):
+    """Antepone NaN a un resultado de ventana móvil hasta completar n filas"""
+    salida = np.full(n, np.nan)
+    if len(valores) > 0:
+        salida[n - len(valores):] = valores
+    return salida
+
+
+def _ventanas_previas(valores, w):
+    """Vista deslizante (sin copia) de ancho w sobre la serie desplazada un día"""
+    previos = _desplazar(np.asarray(valores, dtype=float), 1)
+    if len(previos) >= w:
+        return np.lib.stride_tricks.sliding_window_view(previos, w)
+    return np.empty((0, w))
+
+
+@lru_cache(maxsize=8)
+def _pesos_tendencia(w):
+    """Pesos (x - x̄) / sum((x - x̄)²) de la pendiente lineal sobre w puntos"""
+    x = np.arange(w) - (w - 1) / 2
+    return x / (x @ x)
+
+
+def _desplazar_filas(matriz):
+    """Equivalente a DataFrame.shift(1) sobre una matriz 2D de NumPy"""
+    salida = np.full(matriz.shape, np.nan)
+    salida[1:] = matriz[:-1]
+    return salida
+
+
+def _resumen_filas(matriz):
+    """
+    Media, máximo y std (ddof=1) por fila ignorando NaN, en una pasada sobre la matriz
+    
+    Reproduce DataFrame.mean/max/std(axis=1) sin los avisos de np.nanmean
+    en filas vacías.
+    """
+    validos = ~np.isnan(matriz)
+    n = validos.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(validos, matriz, 0.0).sum(axis=1) / n
+        desvios = np.where(validos, matriz - media[:, None], 0.0)
+        std = np.sqrt((desvios ** 2).sum(axis=1) / (n - 1))
+    std[n < 2] = np.nan
+    return media, np.fmax.reduce(matriz, axis=1), std
+
+
+def _features_tmin(tmin, ventanas=(3, 7, 14, 30), ventanas_tendencia=(7, 14, 30), cuantiles=False):
+    """
+    Calcula en una sola pasada todos los features derivados de TMIN
+    
+    Cada ventana se recorre una única vez mediante una vista deslizante
+    (sin copias) sobre la serie desplazada, y de ella salen media, std,
+    mínimo, máximo, rango, tendencia y cuantiles.
+    
+    Args:
+        tmin: array 1D con la temperatura mínima ordenada por fecha
+        ventanas: ventanas para media/std/min/max
+        ventanas_tendencia: ventanas para tendencia, rango y cuantiles
+        cuantiles: si True agrega q25/q75 (solo modelo de Madrid)
+    """
+    tmin = np.asarray(tmin, dtype=float)
+    n = len(tmin)
+    features = {}
+    
+    # Rezagos
+    for lag in [1, 2, 3, 7, 14, 21, 30]:
+        features[f'TMIN_lag_{lag}'] = _desplazar(tmin, lag)
+    
+    # Rolling + tendencias + quantiles sobre la misma vista
+    for w in sorted(set(ventanas) | set(ventanas_tendencia)):
+        vista = _ventanas_previas(tmin, w)
+        minimo = vista.min(axis=1)
+        maximo = vista.max(axis=1)
+        
+        if w in ventanas:
+            features[f'TMIN_ma_{w}'] = _rellenar_inicio(vista.mean(axis=1), n)
+            features[f'TMIN_std_{w}'] = _rellenar_inicio(vista.std(axis=1, ddof=1), n)
+            features[f'TMIN_min_{w}'] = _rellenar_inicio(minimo, n)
+            features[f'TMIN_max_{w}'] = _rellenar_inicio(maximo, n)
+        
+        if w in ventanas_tendencia:
+            # Pendiente de mínimos cuadrados en forma cerrada: sum((x - x̄)·y) / sum((x - x̄)²).
+            # Los pesos solo dependen de w, así que cada ventana es un único producto escalar.
+            features[f'TMIN_tendencia_{w}'] = _rellenar_inicio(vista @ _pesos_tendencia(w), n)
+            features[f'TMIN_rango_{w}'] = _rellenar_inicio(maximo - minimo, n)
+            
+            if cuantiles:
+                q25, q75 = np.quantile(vista, [0.25, 0.75], axis=1)
+                features[f'TMIN_q25_{w}'] = _rellenar_inicio(q25, n)
+                features[f'TMIN_q75_{w}'] = _rellenar_inicio(q75, n)
+    
+    # Diferencias y aceleración
+    for lag in [1, 7, 30]:
+        features[f'TMIN_diff_{lag}'] = tmin - _desplazar(tmin, lag)
+    features['TMIN_aceleracion'] = features['TMIN_diff_1'] - _desplazar(features['TMIN_diff_1'], 1)
+    
+    return features
+
+
+def _plegar_scaler(modelo, scaler):
+    """
+    Integra un StandardScaler en los coeficientes de un modelo lineal
+    
+    ((x - μ) / σ) · w + b  =  x · (w / σ) + (b - μ · w / σ)
+    
+    Returns:
+        tuple (pesos, sesgo) o None si el modelo/scaler no admite la fusión
+    """
+    if not isinstance(scaler, StandardScaler):
+        return None
+    if not isinstance(modelo, (LinearRegression, Ridge, LogisticRegression, RidgeClassifier)):
+        return None
+    
+    coef = np.asarray(modelo.coef_, dtype=float)
+    if coef.ndim == 2:
+        if coef.shape[0] != 1:
+            return None
+        coef = coef[0]
+    
+    # Igual que transform: sin centrar con with_mean=False, sin escalar con with_std=False
+    media = scaler.mean_ if scaler.with_mean and scaler.mean_ is not None else 0.0
+    escala = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else 1.0
+    pesos = coef / escala
+    sesgo = float(np.ravel(modelo.intercept_)[0]) - float(np.sum(media * pesos))
+    return pesos, sesgo
+
+
+def _evaluar(modelos, tipo, X):
+    """Salida cruda del modelo 'temp' (predict) o 'helada' (decision_function) para una matriz de filas"""
+    afin = modelos[f'afin_{tipo}']
+    if afin is not None:
+        pesos, sesgo = afin
+        return X @ pesos + sesgo
+    
+    modelo = modelos[tipo]
+    salida = modelo.predict if tipo == 'temp' else modelo.decision_function
+    X = pd.DataFrame(X, columns=modelos[f'features_{tipo}'])
+    return np.asarray(salida(modelos[f'scaler_{tipo}'].transform(X)), dtype=float)
+
+
 class PredictorHeladasMulti:
     def __init__(self):
         base_dir = Path(__file__).parent.parent / "Datos"
@@ -17,8 +231,10 @@ class PredictorHeladasMulti:
         self.metadata_path = base_dir / "datos_prediccion" / "metadata_estaciones.csv"
         
         # ✅ Cache de predicciones
-        self._ultima_prediccion = None
-        self._fecha_cache = None
+        self._cache_predicciones = {}
+        self._cache_arreglos = None
+        self._cache_estaciones = {}
+        self._cache_indices = {}
         
         print("="*60)
         print("PREDICTOR HÍBRIDO OFICIAL")
@@ -74,212 +290,286 @@ class PredictorHeladasMulti:
         print("⚠️ Usando coordenadas por defecto")
 
     def _cargar_modelos(self):
+        """Carga una sola vez los artefactos de ambos modelos (modelo, scaler y features)"""
         print("Cargando modelos...")
         
-        # MADRID
-        self.m_temp = joblib.load(self.modelo_madrid_dir / "modelo_temperatura_ridge.pkl")
-        self.s_temp = joblib.load(self.modelo_madrid_dir / "scaler_temperatura.pkl")
-        self.f_temp = joblib.load(self.modelo_madrid_dir / "features_temperatura.pkl")
-        self.m_helada = joblib.load(self.modelo_madrid_dir / "modelo_helada_ridge.pkl")
-        self.s_helada = joblib.load(self.modelo_madrid_dir / "scaler_helada.pkl")
-        self.f_helada = joblib.load(self.modelo_madrid_dir / "features_helada.pkl")
-        
-        # RESTO
-        self.mu_temp = joblib.load(self.modelo_unificado_dir / "modelo_temperatura_SIN_MADRID.pkl")
-        self.su_temp = joblib.load(self.modelo_unificado_dir / "scaler_temperatura_SIN_MADRID.pkl")
-        self.fu_temp = joblib.load(self.modelo_unificado_dir / "features_temperatura_SIN_MADRID.pkl")
-        self.mu_helada = joblib.load(self.modelo_unificado_dir / "modelo_helada_SIN_MADRID.pkl")
-        self.su_helada = joblib.load(self.modelo_unificado_dir / "scaler_helada_SIN_MADRID.pkl")
-        self.fu_helada = joblib.load(self.modelo_unificado_dir / "features_helada_SIN_MADRID.pkl")
+        def cargar(directorio, sufijo_modelo, sufijo_artefactos, crear_features):
+            modelos = {
+                'temp': joblib.load(directorio / f"modelo_temperatura{sufijo_modelo}.pkl"),
+                'scaler_temp': joblib.load(directorio / f"scaler_temperatura{sufijo_artefactos}.pkl"),
+                'features_temp': joblib.load(directorio / f"features_temperatura{sufijo_artefactos}.pkl"),
+                'helada': joblib.load(directorio / f"modelo_helada{sufijo_modelo}.pkl"),
+                'scaler_helada': joblib.load(directorio / f"scaler_helada{sufijo_artefactos}.pkl"),
+                'features_helada': joblib.load(directorio / f"features_helada{sufijo_artefactos}.pkl"),
+                'crear_features': crear_features,
+            }
+            # Scaler fusionado con el modelo: una sola operación afín por predicción
+            modelos['afin_temp'] = _plegar_scaler(modelos['temp'], modelos['scaler_temp'])
+            modelos['afin_helada'] = _plegar_scaler(modelos['helada'], modelos['scaler_helada'])
+            return modelos
+        
+        self._modelos = {
+            # MADRID
+            'madrid': cargar(self.modelo_madrid_dir, "_ridge", "", self._crear_features_madrid),
+            # RESTO
+            'unificado': cargar(self.modelo_unificado_dir, "_SIN_MADRID", "_SIN_MADRID",
+                                self._crear_features_unificado),
+        }
 
         print("✅ Modelos cargados")
 
+    def _grupo_estacion(self, codigo):
+        """Nombre del grupo de modelos ('madrid' o 'unificado') que usa una estación"""
+        return 'madrid' if codigo == CODIGO_MADRID else 'unificado'
+
+    def _modelos_estacion(self, codigo):
+        """Devuelve los artefactos ya cargados que corresponden a una estación"""
+        return self._modelos[self._grupo_estacion(codigo)]
+
     def _cargar_datos(self):
         path = self.datos_dir / "cundinamarca_imputado_v1.csv"
-        self.df = pd.read_csv(path)
-        self.df["Fecha"] = pd.to_datetime(self.df["Fecha"])
+        path_parquet = path.with_suffix(".parquet")
+        
+        # ✅ Copia en Parquet (fechas ya parseadas); se regenera si el CSV es más reciente
+        self.df = None
+        if path_parquet.exists() and path_parquet.stat().st_mtime >= path.stat().st_mtime:
+            try:
+                self.df = pd.read_parquet(path_parquet, engine="pyarrow")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo leer {path_parquet.name}: {e}")
+        
+        if self.df is None:
+            self.df = pd.read_csv(path)
+            self.df["Fecha"] = pd.to_datetime(self.df["Fecha"])
+            try:
+                self.df.to_parquet(path_parquet, engine="pyarrow", index=False)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo guardar {path_parquet.name}: {e}")
+        
+        if not self.df["Fecha"].is_monotonic_increasing:
+            self.df = self.df.sort_values("Fecha", kind="stable", ignore_index=True)
+        # Fechas ordenadas para recortar la historia por búsqueda binaria
+        self._fechas = self.df["Fecha"].to_numpy()
+        self._ultima_fecha = self.df["Fecha"].iloc[-1]
+        self._preparar_arreglos()
         print(f"✅ Datos cargados: {len(self.df)} registros")
 
+    def _preparar_arreglos(self):
+        """
+        Guarda las series de trabajo como arrays de NumPy (estructura de arrays)
+        
+        Cada estación arma su pequeño frame de features a partir de estos arrays
+        en lugar de seleccionar y filtrar columnas sobre toda la historia.
+        """
+        self.columnas_prec = [col for col in self.df.columns if 'PREC' in col]
+        self.columnas_tmax = [col for col in self.df.columns if 'TMax' in col]
+        self._columnas_clima = self.columnas_prec + self.columnas_tmax
+        self._clima = self.df[self._columnas_clima].to_numpy(dtype=float)
+        
+        # Por columna TMIN: valores y posiciones (crecientes) de las filas con dato
+        self._tmin = {}
+        self._filas_tmin = {}
+        for col in self.df.columns:
+            if col.startswith('TMin_'):
+                valores = self.df[col].to_numpy(dtype=float)
+                self._tmin[col] = valores
+                self._filas_tmin[col] = np.flatnonzero(~np.isnan(valores))
+
     def _crear_features_madrid(self, df_input, target_col, incluir_prec_tmax=False):
         """Features COMPLETOS para Madrid (con Trimestre y quantiles)"""
-        df_out = df_input.copy()
+        fecha = df_input['Fecha']
+        tmin = df_input[target_col]
+        nuevas = {}
         
         # Temporales COMPLETOS
-        df_out['Mes'] = df_out['Fecha'].dt.month
-        df_out['DíaAño'] = df_out['Fecha'].dt.dayofyear
-        df_out['Trimestre'] = df_out['Fecha'].dt.quarter
-        df_out['DiaSemana'] = df_out['Fecha'].dt.dayofweek
-        df_out['Semana'] = df_out['Fecha'].dt.isocalendar().week
+        nuevas['Mes'] = fecha.dt.month
+        nuevas['DíaAño'] = fecha.dt.dayofyear
+        nuevas['Trimestre'] = fecha.dt.quarter
+        nuevas['DiaSemana'] = fecha.dt.dayofweek
+        nuevas['Semana'] = fecha.dt.isocalendar().week
         
         # Cíclicos
-        df_out['Mes_sin'] = np.sin(2 * np.pi * df_out['Mes'] / 12)
-        df_out['Mes_cos'] = np.cos(2 * np.pi * df_out['Mes'] / 12)
-        df_out['DíaAño_sin'] = np.sin(2 * np.pi * df_out['DíaAño'] / 365)
-        df_out['DíaAño_cos'] = np.cos(2 * np.pi * df_out['DíaAño'] / 365)
-        df_out['Semana_sin'] = np.sin(2 * np.pi * df_out['Semana'] / 52)
-        df_out['Semana_cos'] = np.cos(2 * np.pi * df_out['Semana'] / 52)
-        df_out['DiaSemana_sin'] = np.sin(2 * np.pi * df_out['DiaSemana'] / 7)
-        df_out['DiaSemana_cos'] = np.cos(2 * np.pi * df_out['DiaSemana'] / 7)
-        
-        # Rezagos
-        for lag in [1, 2, 3, 7, 14, 21, 30]:
-            df_out[f'TMIN_lag_{lag}'] = df_out[target_col].shift(lag)
-        
-        # Rolling
-        for window in [3, 7, 14, 30]:
-            df_out[f'TMIN_ma_{window}'] = df_out[target_col].shift(1).rolling(window).mean()
-            df_out[f'TMIN_std_{window}'] = df_out[target_col].shift(1).rolling(window).std()
-            df_out[f'TMIN_min_{window}'] = df_out[target_col].shift(1).rolling(window).min()
-            df_out[f'TMIN_max_{window}'] = df_out[target_col].shift(1).rolling(window).max()
-        
-        # Diferencias
-        df_out['TMIN_diff_1'] = df_out[target_col].diff(1)
-        df_out['TMIN_diff_7'] = df_out[target_col].diff(7)
-        df_out['TMIN_diff_30'] = df_out[target_col].diff(30)
-        
-        # Tendencias
-        def calcular_tendencia(serie):
-            if len(serie) < 5 or serie.isna().all():
-                return 0
-            try:
-                return np.polyfit(np.arange(len(serie)), serie.values, 1)[0]
-            except:
-                return 0
-        
-        for window in [7, 14, 30]:
-            df_out[f'TMIN_tendencia_{window}'] = df_out[target_col].shift(1).rolling(window).apply(
-                calcular_tendencia, raw=False
-            )
-        
-        # Rangos
-        for window in [7, 14, 30]:
-            df_out[f'TMIN_rango_{window}'] = df_out[f'TMIN_max_{window}'] - df_out[f'TMIN_min_{window}']
-        
-        # QUANTILES
-        for window in [7, 14, 30]:
-            df_out[f'TMIN_q25_{window}'] = df_out[target_col].shift(1).rolling(window).quantile(0.25)
-            df_out[f'TMIN_q75_{window}'] = df_out[target_col].shift(1).rolling(window).quantile(0.75)
+        _features_ciclicos(nuevas)
         
-        # Aceleración
-        df_out['TMIN_aceleracion'] = df_out['TMIN_diff_1'].diff(1)
+        # Rezagos, rolling, diferencias, tendencias, rangos y quantiles
+        nuevas.update(_features_tmin(tmin.to_numpy(dtype=float), cuantiles=True))
         
         # PREC y TMax
+        columnas_prec = []
+        columnas_tmax = []
         if incluir_prec_tmax:
-            columnas_prec = [col for col in df_out.columns if 'PREC' in col and col != target_col]
-            columnas_tmax = [col for col in df_out.columns if 'TMax' in col and col != target_col]
+            columnas_prec = [col for col in df_input.columns if 'PREC' in col and col != target_col]
+            columnas_tmax = [col for col in df_input.columns if 'TMax' in col and col != target_col]
             
             if len(columnas_prec) > 0:
-                for col in columnas_prec:
-                    df_out[f'{col}_lag1'] = df_out[col].shift(1)
+                prec_lag = _desplazar_filas(df_input[columnas_prec].to_numpy(dtype=float))
+                for i, col in enumerate(columnas_prec):
+                    nuevas[f'{col}_lag1'] = prec_lag[:, i]
                 
-                cols_prec_lag = [f'{col}_lag1' for col in columnas_prec]
-                df_out['PREC_promedio'] = df_out[cols_prec_lag].mean(axis=1)
-                df_out['PREC_max'] = df_out[cols_prec_lag].max(axis=1)
-                df_out['PREC_std'] = df_out[cols_prec_lag].std(axis=1)
+                nuevas['PREC_promedio'], nuevas['PREC_max'], nuevas['PREC_std'] = _resumen_filas(prec_lag)
                 
                 for lag in [2, 3, 7]:
-                    df_out[f'PREC_promedio_lag{lag}'] = df_out['PREC_promedio'].shift(lag)
+                    nuevas[f'PREC_promedio_lag{lag}'] = _desplazar(nuevas['PREC_promedio'], lag)
                 
                 for window in [3, 7, 14]:
-                    df_out[f'PREC_suma_{window}'] = df_out['PREC_promedio'].shift(1).rolling(window).sum()
+                    nuevas[f'PREC_suma_{window}'] = _rellenar_inicio(
+                        _ventanas_previas(nuevas['PREC_promedio'], window).sum(axis=1), len(df_input))
             
             if len(columnas_tmax) > 0:
-                for col in columnas_tmax:
-                    df_out[f'{col}_lag1'] = df_out[col].shift(1)
+                tmax_lag = _desplazar_filas(df_input[columnas_tmax].to_numpy(dtype=float))
+                for i, col in enumerate(columnas_tmax):
+                    nuevas[f'{col}_lag1'] = tmax_lag[:, i]
                 
-                cols_tmax_lag = [f'{col}_lag1' for col in columnas_tmax]
-                df_out['TMAX_promedio'] = df_out[cols_tmax_lag].mean(axis=1)
-                df_out['TMAX_std'] = df_out[cols_tmax_lag].std(axis=1)
-                df_out['Rango_termico_lag1'] = df_out['TMAX_promedio'] - df_out['TMIN_lag_1']
+                nuevas['TMAX_promedio'], _, nuevas['TMAX_std'] = _resumen_filas(tmax_lag)
+                nuevas['Rango_termico_lag1'] = nuevas['TMAX_promedio'] - nuevas['TMIN_lag_1']
                 
                 for window in [3, 7, 14]:
-                    df_out[f'TMAX_ma_{window}'] = df_out['TMAX_promedio'].shift(1).rolling(window).mean()
+                    nuevas[f'TMAX_ma_{window}'] = _rellenar_inicio(
+                        _ventanas_previas(nuevas['TMAX_promedio'], window).mean(axis=1), len(df_input))
                 
-                df_out['TMAX_diff_1'] = df_out['TMAX_promedio'].diff(1)
+                nuevas['TMAX_diff_1'] = nuevas['TMAX_promedio'] - _desplazar(nuevas['TMAX_promedio'], 1)
             
-            if 'TMAX_promedio' in df_out.columns and 'TMIN_lag_1' in df_out.columns:
-                df_out['TMax_TMin_ratio'] = df_out['TMAX_promedio'] / (df_out['TMIN_lag_1'].abs() + 1)
+            if 'TMAX_promedio' in nuevas:
+                nuevas['TMax_TMin_ratio'] = nuevas['TMAX_promedio'] / (np.abs(nuevas['TMIN_lag_1']) + 1)
             
-            if 'PREC_promedio' in df_out.columns:
-                df_out['PREC_binaria'] = (df_out['PREC_promedio'] > 0).astype(int)
-            
-            for col in columnas_prec + columnas_tmax:
-                if col in df_out.columns:
-                    df_out.drop(col, axis=1, inplace=True)
-        
+            if 'PREC_promedio' in nuevas:
+                nuevas['PREC_binaria'] = (nuevas['PREC_promedio'] > 0).astype(int)
+        
+        # Una sola concatenación en lugar de insertar columna por columna
+        df_out = pd.concat(
+            [df_input.drop(columns=columnas_prec + columnas_tmax), pd.DataFrame(nuevas, index=df_input.index)],
+            axis=1
+        )
         return df_out.dropna().reset_index(drop=True)
 
     def _crear_features_unificado(self, df_input, target_col, incluir_prec_tmax=False):
         """Features para modelo unificado (SIN Trimestre, SIN quantiles)"""
-        df_out = df_input.copy()
-        
-        df_out['Mes'] = df_out['Fecha'].dt.month
-        df_out['DíaAño'] = df_out['Fecha'].dt.dayofyear
-        df_out['Semana'] = df_out['Fecha'].dt.isocalendar().week
-        df_out['DiaSemana'] = df_out['Fecha'].dt.dayofweek
-        
-        df_out['Mes_sin'] = np.sin(2 * np.pi * df_out['Mes']/12)
-        df_out['Mes_cos'] = np.cos(2 * np.pi * df_out['Mes']/12)
-        df_out['DíaAño_sin'] = np.sin(2 * np.pi * df_out['DíaAño']/365)
-        df_out['DíaAño_cos'] = np.cos(2 * np.pi * df_out['DíaAño']/365)
-        df_out['Semana_sin'] = np.sin(2 * np.pi * df_out['Semana']/52)
-        df_out['Semana_cos'] = np.cos(2 * np.pi * df_out['Semana']/52)
-        df_out['DiaSemana_sin'] = np.sin(2 * np.pi * df_out['DiaSemana']/7)
-        df_out['DiaSemana_cos'] = np.cos(2 * np.pi * df_out['DiaSemana']/7)
-
-        for lag in [1,2,3,7,14,21,30]:
-            df_out[f'TMIN_lag_{lag}'] = df_out[target_col].shift(lag)
-
-        for w in [3,7,14,30]:
-            df_out[f'TMIN_ma_{w}'] = df_out[target_col].shift(1).rolling(w).mean()
-            df_out[f'TMIN_std_{w}'] = df_out[target_col].shift(1).rolling(w).std()
-            df_out[f'TMIN_min_{w}'] = df_out[target_col].shift(1).rolling(w).min()
-            df_out[f'TMIN_max_{w}'] = df_out[target_col].shift(1).rolling(w).max()
-
-        df_out['TMIN_diff_1'] = df_out[target_col].diff(1)
-        df_out['TMIN_diff_7'] = df_out[target_col].diff(7)
-        df_out['TMIN_diff_30'] = df_out[target_col].diff(30)
-
-        def tendencia(s):
-            if len(s) < 5 or s.isna().all(): return 0
-            try: return np.polyfit(np.arange(len(s)), s, 1)[0]
-            except: return 0
-
-        for w in [7,14,30]:
-            df_out[f'TMIN_tendencia_{w}'] = df_out[target_col].shift(1).rolling(w).apply(tendencia, raw=False)
-            df_out[f'TMIN_rango_{w}'] = df_out[f'TMIN_max_{w}'] - df_out[f'TMIN_min_{w}']
-
-        df_out['TMIN_aceleracion'] = df_out['TMIN_diff_1'].diff(1)
+        fecha = df_input['Fecha']
+        tmin = df_input[target_col]
+        nuevas = {}
+        
+        nuevas['Mes'] = fecha.dt.month
+        nuevas['DíaAño'] = fecha.dt.dayofyear
+        nuevas['Semana'] = fecha.dt.isocalendar().week
+        nuevas['DiaSemana'] = fecha.dt.dayofweek
+        
+        _features_ciclicos(nuevas)
+
+        nuevas.update(_features_tmin(tmin.to_numpy(dtype=float)))
         
         # PREC y TMax
+        columnas_prec = []
+        columnas_tmax = []
         if incluir_prec_tmax:
-            columnas_prec = [col for col in df_out.columns if 'PREC' in col and col != target_col]
-            columnas_tmax = [col for col in df_out.columns if 'TMax' in col and col != target_col]
+            columnas_prec = [col for col in df_input.columns if 'PREC' in col and col != target_col]
+            columnas_tmax = [col for col in df_input.columns if 'TMax' in col and col != target_col]
             
             if len(columnas_prec) > 0:
-                for col in columnas_prec:
-                    df_out[f'{col}_lag1'] = df_out[col].shift(1)
+                prec_lag = _desplazar_filas(df_input[columnas_prec].to_numpy(dtype=float))
+                for i, col in enumerate(columnas_prec):
+                    nuevas[f'{col}_lag1'] = prec_lag[:, i]
                 
-                cols_prec_lag = [f'{col}_lag1' for col in columnas_prec]
-                df_out['PREC_promedio'] = df_out[cols_prec_lag].mean(axis=1)
-                df_out['PREC_binaria'] = (df_out['PREC_promedio'] > 0).astype(int)
+                nuevas['PREC_promedio'] = _resumen_filas(prec_lag)[0]
+                nuevas['PREC_binaria'] = (nuevas['PREC_promedio'] > 0).astype(int)
             
             if len(columnas_tmax) > 0:
-                for col in columnas_tmax:
-                    df_out[f'{col}_lag1'] = df_out[col].shift(1)
-                
-                cols_tmax_lag = [f'{col}_lag1' for col in columnas_tmax]
-                df_out['TMAX_promedio'] = df_out[cols_tmax_lag].mean(axis=1)
+                tmax_lag = _desplazar_filas(df_input[columnas_tmax].to_numpy(dtype=float))
+                for i, col in enumerate(columnas_tmax):
+                    nuevas[f'{col}_lag1'] = tmax_lag[:, i]
                 
-                if 'TMIN_lag_1' in df_out.columns:
-                    df_out['Rango_termico_lag1'] = df_out['TMAX_promedio'] - df_out['TMIN_lag_1']
-            
-            for col in columnas_prec + columnas_tmax:
-                if col in df_out.columns:
-                    df_out.drop(col, axis=1, inplace=True)
-        
+                nuevas['TMAX_promedio'] = _resumen_filas(tmax_lag)[0]
+                nuevas['Rango_termico_lag1'] = nuevas['TMAX_promedio'] - nuevas['TMIN_lag_1']
+        
+        # Una sola concatenación en lugar de insertar columna por columna
+        df_out = pd.concat(
+            [df_input.drop(columns=columnas_prec + columnas_tmax), pd.DataFrame(nuevas, index=df_input.index)],
+            axis=1
+        )
         return df_out.dropna().reset_index(drop=True)
 
+    def _indices_features(self, codigo, columnas, modelos):
+        """Posiciones de features_temp y features_helada en el frame de features (cacheadas por estación)"""
+        if codigo not in self._cache_indices:
+            indices = []
+            for clave in ('features_temp', 'features_helada'):
+                idx = columnas.get_indexer(modelos[clave])
+                if (idx < 0).any():
+                    faltantes = [f for f, i in zip(modelos[clave], idx) if i < 0]
+                    raise KeyError(f"Features no encontrados: {faltantes}")
+                indices.append(idx)
+            self._cache_indices[codigo] = tuple(indices)
+        return self._cache_indices[codigo]
+
+    def _predecir_estacion(self, codigo, nombre_col, fecha_limite, fin, medias_hoy):
+        """
+        Filas de features de una estación, memorizadas por (estación, último día de datos)
+        
+        Returns:
+            tuple (codigo, nombre, coords_info, x_temp, x_helada) o None si no se pudo calcular
+        """
+        clave = (codigo, fecha_limite)
+        if clave in self._cache_estaciones:
+            return self._cache_estaciones[clave]
+        
+        estacion = self._calcular_estacion(codigo, nombre_col, fin, medias_hoy)
+        # Los fallos no se memorizan: pueden ser temporales (p. ej. datos a medio actualizar)
+        if estacion is not None:
+            self._cache_estaciones[clave] = estacion
+        return estacion
+
+    def _calcular_estacion(self, codigo, nombre_col, fin, medias_hoy):
+        """Calcula la fila de features de una estación con la historia de las primeras `fin` filas"""
+        col_tmin = next((c for c in self._tmin if c.startswith(f"TMin_{codigo}_")), None)
+        
+        if not col_tmin:
+            return None
+
+        try:
+            # OBTENER NOMBRE Y COORDENADAS DESDE CSV
+            coords_info = self.coordenadas.get(codigo, {})
+            nombre_estacion = coords_info.get('nombre', nombre_col)
+            
+            modelos = self._modelos_estacion(codigo)
+            if codigo == CODIGO_MADRID:
+                print(f"   → Madrid: usando modelo dedicado")
+            
+            filas = self._filas_tmin[col_tmin]
+            filas = filas[:np.searchsorted(filas, fin)]
+            if len(filas) < 50:
+                return None
+            
+            # Las medias de relleno usan toda la historia, pero los features
+            # solo se calculan sobre las últimas filas (solo se predice el último día).
+            # Si la estación tiene TMIN en todas las filas, sus medias son las de
+            # df_hoy, que se calculan una sola vez para todas las estaciones.
+            if len(filas) == fin:
+                medias = medias_hoy
+            else:
+                medias = pd.DataFrame(self._clima[filas], columns=self._columnas_clima).mean()
+            
+            cola = filas[-FILAS_FEATURES:]
+            df_helada = pd.DataFrame(self._clima[cola], columns=self._columnas_clima).fillna(medias)
+            df_helada.insert(0, col_tmin, self._tmin[col_tmin][cola])
+            df_helada.insert(0, 'Fecha', self._fechas[cola])
+            
+            # Los features de temperatura son un subconjunto de los de helada:
+            # se construyen una sola vez y se selecciona cada conjunto
+            df_feat = modelos['crear_features'](df_helada, col_tmin, incluir_prec_tmax=True)
+            if len(df_feat) == 0:
+                return None
+            
+            idx_temp, idx_helada = self._indices_features(codigo, df_feat.columns, modelos)
+            
+            # Solo la última fila; los modelos se evalúan después para todas las estaciones
+            x_temp = df_feat.iloc[[-1], idx_temp].to_numpy(dtype=float)[0]
+            x_helada = df_feat.iloc[[-1], idx_helada].to_numpy(dtype=float)[0]
+
+            return codigo, nombre_estacion, coords_info, x_temp, x_helada
+
+        except Exception:
+            logger.exception(f"   ❌ Error en {codigo}")
+            return None
+
     def predecir(self, fecha_consulta=None, forzar_recalculo=False):
         """
         Genera predicciones híbridas con sistema de caché
@@ -289,25 +579,33 @@ class PredictorHeladasMulti:
             forzar_recalculo: Si True, ignora el caché y recalcula (default: False)
         """
         if fecha_consulta is None:
-            fecha_consulta = pd.Timestamp.now().normalize()
+            fecha_consulta = _fecha_hoy(int(time.time() // 60))
         else:
-            fecha_consulta = pd.to_datetime(fecha_consulta).normalize()
+            fecha_consulta = _normalizar_fecha(fecha_consulta)
 
         # ✅ Verificar caché
-        if not forzar_recalculo and self._ultima_prediccion is not None:
-            if self._fecha_cache == fecha_consulta:
-                print("📦 Usando predicción cacheada")
-                return self._ultima_prediccion
+        clave = fecha_consulta.date()
+        if not forzar_recalculo and clave in self._cache_predicciones:
+            print("📦 Usando predicción cacheada")
+            return self._cache_predicciones[clave][0]
 
         print("🔄 Calculando nueva predicción...")
 
+        if forzar_recalculo:
+            self._cache_estaciones.clear()
+
         fecha_limite = fecha_consulta - timedelta(days=1)
-        df_hoy = self.df[self.df['Fecha'] <= fecha_limite].copy()
+        # Historia hasta fecha_limite sin máscara booleana ni copia: con datos al día
+        # es el frame completo; si no, una vista recortada por búsqueda binaria
+        if fecha_limite >= self._ultima_fecha:
+            fin = len(self.df)
+            df_hoy = self.df
+        else:
+            fin = np.searchsorted(self._fechas, np.datetime64(fecha_limite), side='right')
+            df_hoy = self.df.iloc[:fin]
         if len(df_hoy) < 100:
             return {"error": "Datos insuficientes"}
 
-        predicciones = []
-        
         # Detectar estaciones
         cols_tmin = [c for c in df_hoy.columns if c.startswith('TMin_')]
         estaciones_disponibles = {}
@@ -321,165 +619,158 @@ class PredictorHeladasMulti:
 
         print(f"📊 Estaciones: {len(estaciones_disponibles)}")
 
-        # Columnas PREC y TMax
-        columnas_prec = [col for col in df_hoy.columns if 'PREC' in col]
-        columnas_tmax = [col for col in df_hoy.columns if 'TMax' in col]
+        medias_hoy = df_hoy[self._columnas_clima].mean()
 
-        for codigo, nombre_col in estaciones_disponibles.items():
-            col_tmin = next((c for c in df_hoy.columns if c.startswith(f"TMin_{codigo}_")), None)
-            
-            if not col_tmin:
-                continue
+        # Cada estación es independiente: se calculan en paralelo (hilos, sin copiar datos)
+        resultados = Parallel(n_jobs=-1, prefer='threads')(
+            delayed(self._predecir_estacion)(codigo, nombre_col, fecha_limite, fin, medias_hoy)
+            for codigo, nombre_col in estaciones_disponibles.items()
+        )
+        resultados = [r for r in resultados if r is not None]
 
-            try:
-                # OBTENER NOMBRE Y COORDENADAS DESDE CSV
-                coords_info = self.coordenadas.get(codigo, {})
-                nombre_estacion = coords_info.get('nombre', nombre_col)
-                
-                if codigo == "21205880":
-                    # MADRID
-                    print(f"   → Madrid: usando modelo dedicado")
-                    
-                    df_temp = df_hoy[['Fecha', col_tmin]].dropna()
-                    if len(df_temp) < 50:
-                        continue
-                    
-                    df_feat_temp = self._crear_features_madrid(df_temp, col_tmin, incluir_prec_tmax=False)
-                    if len(df_feat_temp) == 0:
-                        continue
-                    
-                    X = df_feat_temp[self.f_temp].iloc[[-1]]
-                    temp_pred = float(self.m_temp.predict(self.s_temp.transform(X))[0])
-                    
-                    df_helada = df_hoy[['Fecha', col_tmin] + columnas_prec + columnas_tmax].copy()
-                    df_helada = df_helada.dropna(subset=[col_tmin])
-                    
-                    for col in columnas_prec + columnas_tmax:
-                        if df_helada[col].isna().any():
-                            df_helada[col].fillna(df_helada[col].mean(), inplace=True)
-                    
-                    df_feat_helada = self._crear_features_madrid(df_helada, col_tmin, incluir_prec_tmax=True)
-                    if len(df_feat_helada) == 0:
-                        continue
-                    
-                    Xh = df_feat_helada[self.f_helada].iloc[[-1]]
-                    score = self.m_helada.decision_function(self.s_helada.transform(Xh))[0]
-                    
-                else:
-                    # OTRAS ESTACIONES
-                    df_temp = df_hoy[['Fecha', col_tmin]].dropna()
-                    if len(df_temp) < 50:
-                        continue
-                    
-                    df_feat_temp = self._crear_features_unificado(df_temp, col_tmin, incluir_prec_tmax=False)
-                    if len(df_feat_temp) == 0:
-                        continue
-                    
-                    X = df_feat_temp[self.fu_temp].iloc[[-1]]
-                    temp_pred = float(self.mu_temp.predict(self.su_temp.transform(X))[0])
-                    
-                    df_helada = df_hoy[['Fecha', col_tmin] + columnas_prec + columnas_tmax].copy()
-                    df_helada = df_helada.dropna(subset=[col_tmin])
-                    
-                    for col in columnas_prec + columnas_tmax:
-                        if df_helada[col].isna().any():
-                            df_helada[col].fillna(df_helada[col].mean(), inplace=True)
-                    
-                    df_feat_helada = self._crear_features_unificado(df_helada, col_tmin, incluir_prec_tmax=True)
-                    if len(df_feat_helada) == 0:
-                        continue
-                    
-                    Xh = df_feat_helada[self.fu_helada].iloc[[-1]]
-                    score = self.mu_helada.decision_function(self.su_helada.transform(Xh))[0]
-
-                # Probabilidad y riesgo
-                prob = 1 / (1 + np.exp(-score)) * 100
-
-                if temp_pred <= -2:
-                    riesgo, emoji, color = "MUY ALTO", "🔴", "red"
-                elif temp_pred <= 0:
-                    riesgo, emoji, color = "ALTO", "🟠", "orange"
-                elif temp_pred <= 2:
-                    riesgo, emoji, color = "MEDIO", "🟡", "yellow"
-                elif temp_pred <= 4:
-                    riesgo, emoji, color = "BAJO", "🟢", "lightblue"
-                else:
-                    riesgo, emoji, color = "MUY BAJO", "🟢", "green"
-
-                predicciones.append({
-                    "codigo": codigo,
-                    "nombre": nombre_estacion,
-                    "temperatura_predicha": round(temp_pred, 2),
-                    "probabilidad_helada": round(prob, 1),
-                    "riesgo": riesgo,
-                    "emoji_riesgo": emoji,
-                    "color_mapa": color,
-                    "lat": coords_info.get('lat'),
-                    "lon": coords_info.get('lon'),
-                    "alt": coords_info.get('alt', 0)
-                })
-                
-                print(f"   ✅ {nombre_estacion}: {temp_pred:.1f}°C ({riesgo})")
+        if len(resultados) == 0:
+            return {"error": "No se generaron predicciones"}
 
-            except Exception as e:
-                print(f"   ❌ Error en {codigo}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+        # Una evaluación matricial por grupo de modelos en lugar de una por estación
+        grupos = {}
+        for i, r in enumerate(resultados):
+            grupos.setdefault(self._grupo_estacion(r[0]), []).append(i)
+        
+        temps = np.empty(len(resultados))
+        scores = np.empty(len(resultados))
+        evaluadas = np.ones(len(resultados), dtype=bool)
+        for grupo, posiciones in grupos.items():
+            modelos = self._modelos[grupo]
+            try:
+                temps[posiciones] = _evaluar(modelos, 'temp', np.vstack([resultados[i][3] for i in posiciones]))
+                scores[posiciones] = _evaluar(modelos, 'helada', np.vstack([resultados[i][4] for i in posiciones]))
+            except Exception:
+                # Si falla el lote, se evalúa estación por estación y solo se descartan las que fallen
+                logger.exception(f"❌ Error evaluando el modelo '{grupo}'; se reintenta por estación")
+                for i in posiciones:
+                    try:
+                        temps[i] = _evaluar(modelos, 'temp', resultados[i][3][np.newaxis])[0]
+                        scores[i] = _evaluar(modelos, 'helada', resultados[i][4][np.newaxis])[0]
+                    except Exception:
+                        logger.exception(f"   ❌ Error en {resultados[i][0]}")
+                        evaluadas[i] = False
+        
+        if not evaluadas.all():
+            resultados = [r for r, ok in zip(resultados, evaluadas) if ok]
+            temps, scores = temps[evaluadas], scores[evaluadas]
+            if len(resultados) == 0:
+                return {"error": "No se generaron predicciones"}
+        
+        # Probabilidad y riesgo para todas las estaciones a la vez
+        estaciones_calculadas = [r[:3] for r in resultados]
+        probs = expit(scores) * 100
+        niveles = np.searchsorted(LIMITES_RIESGO, temps, side='left')
 
-        if len(predicciones) == 0:
-            return {"error": "No se generaron predicciones"}
+        predicciones = []
+        for (codigo, nombre_estacion, coords_info), temp_pred, prob, nivel in zip(
+            estaciones_calculadas, temps, probs, niveles
+        ):
+            riesgo, emoji, color = NIVELES_RIESGO[nivel]
+            predicciones.append({
+                "codigo": codigo,
+                "nombre": nombre_estacion,
+                "temperatura_predicha": round(float(temp_pred), 2),
+                "probabilidad_helada": round(float(prob), 1),
+                "riesgo": riesgo,
+                "emoji_riesgo": emoji,
+                "color_mapa": color,
+                "lat": coords_info.get('lat'),
+                "lon": coords_info.get('lon'),
+                "alt": coords_info.get('alt', 0)
+            })
+            
+            print(f"   ✅ {nombre_estacion}: {temp_pred:.1f}°C ({riesgo})")
 
         print(f"✅ Total: {len(predicciones)} estaciones")
         
         resultado = {
             "fecha_consulta": fecha_limite.date(),
             "fecha_prediccion": fecha_consulta.date(),
-            "predicciones_estaciones": predicciones
+            "predicciones_estaciones": predicciones,
+            # Índice por código de estación para consultas directas
+            "predicciones_por_codigo": {p["codigo"]: p for p in predicciones}
         }
         
-        # ✅ Guardar en caché
-        self._ultima_prediccion = resultado
-        self._fecha_cache = fecha_consulta
+        # ✅ Guardar en caché (por fecha); se descartan entradas calculadas hace más de 2 días
+        hoy = _fecha_hoy(int(time.time() // 60))
+        self._cache_predicciones = {
+            k: v for k, v in self._cache_predicciones.items() if v[1] >= hoy - timedelta(days=2)
+        }
+        self._cache_predicciones[clave] = (resultado, hoy)
+        # Las filas por estación siguen la misma ventana: solo las de fechas aún cacheadas
+        self._cache_estaciones = {
+            k: v for k, v in self._cache_estaciones.items()
+            if (k[1] + timedelta(days=1)).date() in self._cache_predicciones
+        }
         
         return resultado
 
-    def interpolar_idw(self, lat, lon, predicciones, potencia=2):
-        pesos_total = temp_ponderada = 0
-        
-        for p in predicciones:
-            if p['lat'] is None or p['lon'] is None:
-                continue
-            
-            dlat = (p['lat'] - lat) * 111
-            dlon = (p['lon'] - lon) * 111 * np.cos(np.radians(lat))
-            distancia = np.sqrt(dlat**2 + dlon**2)
-            
-            if distancia < 0.01:
-                return p['temperatura_predicha']
-            
-            peso = 1 / (distancia ** potencia)
-            pesos_total += peso
-            temp_ponderada += peso * p['temperatura_predicha']
+    def _arreglos_estaciones(self, predicciones):
+        """
+        Arrays de NumPy (lat, lon, temperatura, probabilidad) de las
+        estaciones con coordenadas
         
-        return temp_ponderada / pesos_total if pesos_total > 0 else None
+        Se cachean para la última lista recibida, identificada por su contenido
+        (la app pasa copias nuevas de la misma lista en cada rerun), de modo que
+        los clics sucesivos en el mapa no vuelvan a construir los arrays.
+        """
+        clave = tuple(
+            (p['lat'], p['lon'], p['temperatura_predicha'], p['probabilidad_helada']) for p in predicciones
+        )
+        if self._cache_arreglos is None or self._cache_arreglos[0] != clave:
+            validas = [fila for fila in clave if fila[0] is not None and fila[1] is not None]
+            matriz = np.array(validas, dtype=float).reshape(-1, 4)
+            self._cache_arreglos = (clave, tuple(np.ascontiguousarray(columna) for columna in matriz.T))
+        return self._cache_arreglos[1]
 
-    def interpolar_probabilidad_helada(self, lat, lon, predicciones, potencia=2):
-        pesos_total = prob_ponderada = 0
+    def _idw(self, lat, lon, predicciones, potencia, columnas):
+        """
+        Interpolación IDW en un punto de los valores pedidos
         
-        for p in predicciones:
-            if p['lat'] is None or p['lon'] is None:
-                continue
-            
-            dlat = (p['lat'] - lat) * 111
-            dlon = (p['lon'] - lon) * 111 * np.cos(np.radians(lat))
-            distancia = np.sqrt(dlat**2 + dlon**2)
-            
-            if distancia < 0.01:
-                return p['probabilidad_helada']
-            
-            peso = 1 / (distancia ** potencia)
-            pesos_total += peso
-            prob_ponderada += peso * p['probabilidad_helada']
+        Args:
+            columnas: Índices de los valores a interpolar (2: temperatura, 3: probabilidad)
+        
+        Returns:
+            list con un valor por columna o None si no hay estaciones
+        """
+        arreglos = self._arreglos_estaciones(predicciones)
+        lats, lons = arreglos[0], arreglos[1]
+        if len(lats) == 0:
+            return None
+        valores = [arreglos[c] for c in columnas]
+        
+        dlat = (lats - lat) * 111
+        dlon = (lons - lon) * 111 * np.cos(np.radians(lat))
+        distancias = np.hypot(dlat, dlon)
+        
+        cercanas = np.flatnonzero(distancias < 0.01)
+        if len(cercanas) > 0:
+            return [float(v[cercanas[0]]) for v in valores]
+        
+        pesos = 1 / distancias ** potencia
+        return [float(pesos @ v / pesos.sum()) for v in valores]
+
+    def interpolar(self, lat, lon, predicciones, potencia=2):
+        """
+        Interpolación IDW de temperatura y probabilidad de helada en un punto
         
-        return prob_ponderada / pesos_total if pesos_total > 0 else None
\ No newline at end of file
+        Returns:
+            tuple (temperatura, probabilidad) o (None, None) si no hay estaciones
+        """
+        resultado = self._idw(lat, lon, predicciones, potencia, (2, 3))
+        if resultado is None:
+            return None, None
+        return resultado[0], resultado[1]
+
+    def interpolar_idw(self, lat, lon, predicciones, potencia=2):
+        resultado = self._idw(lat, lon, predicciones, potencia, (2,))
+        return None if resultado is None else resultado[0]
+
+    def interpolar_probabilidad_helada(self, lat, lon, predicciones, potencia=2):
+        resultado = self._idw(lat, lon, predicciones, potencia, (3,))
+        return None if resultado is None else resultado[0]
@@ -6,27 +6,119 @@ Se ejecuta en horarios específicos para revisar predicciones
 import logging
 import asyncio
 from datetime import time
+from typing import List, Tuple
 from telegram.ext import Application
 from telegram import Bot
+from telegram.error import RetryAfter
 
-from database import DatabaseManager
-from notificador import NotificadorHeladas
-from config import TELEGRAM_BOT_TOKEN, HORARIOS_CHEQUEO, DB_PATH
+from database import DatabaseManager, DatabaseManagerAsync
+from notificador import NotificadorHeladas, dividir_mensaje
+from config import (
+    TELEGRAM_BOT_TOKEN, HORARIOS_CHEQUEO, DB_PATH, ENVIOS_SIMULTANEOS,
+    REINTENTOS_ENVIO, INTERVALO_REINTENTO_PENDIENTES, configurar_logging
+)
 
 # Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('logs_alertas.txt'),
-        logging.StreamHandler()
-    ]
-)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
 # Inicializar componentes
 db = DatabaseManager(DB_PATH)
-notificador = NotificadorHeladas()
+db_async = DatabaseManagerAsync(db)
+notificador = NotificadorHeladas(ultima_alerta=db.obtener_estado('ultima_alerta'))
+
+
+async def enviar_mensaje(bot: Bot, chat_id: int, partes: List[str], semaforo: asyncio.Semaphore) -> int:
+    """
+    Envía un mensaje (ya dividido en partes) respetando el límite de envíos simultáneos
+    
+    Si Telegram responde con RetryAfter (flood control), espera el tiempo
+    indicado y reintenta, hasta REINTENTOS_ENVIO veces por parte. Las partes
+    se envían en orden y el envío se detiene en la primera que falla.
+    
+    Args:
+        bot: Bot de Telegram
+        chat_id: ID del chat destino
+        partes: Partes del mensaje, ver dividir_mensaje
+        semaforo: Semáforo compartido que limita los envíos simultáneos
+        
+    Returns:
+        Cantidad de partes entregadas (len(partes) si se entregó completo)
+    """
+    async with semaforo:
+        for entregadas, parte in enumerate(partes):
+            for _ in range(REINTENTOS_ENVIO):
+                try:
+                    await bot.send_message(
+                        chat_id=chat_id,
+                        text=parte,
+                        parse_mode='Markdown'
+                    )
+                    break
+                except RetryAfter as e:
+                    logger.warning(f"⏳ Límite de Telegram alcanzado, esperando {e.retry_after}s")
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    logger.error(f"❌ Error enviando alerta a {chat_id}: {e}")
+                    return entregadas
+            else:
+                logger.error(f"❌ Alerta a {chat_id} no enviada tras {REINTENTOS_ENVIO} intentos")
+                return entregadas
+    
+    return len(partes)
+
+
+async def enviar_broadcast(bot: Bot, mensaje_alerta: str, nivel_alerta: str) -> Tuple[int, int]:
+    """
+    Envía una alerta ya formateada a todos los suscriptores activos
+    
+    Los suscriptores se leen por lotes y se notifican en paralelo (limitado
+    por ENVIOS_SIMULTANEOS); al final, contadores e historial se registran
+    en una sola transacción y los envíos fallidos quedan pendientes de reintento.
+    
+    Args:
+        bot: Bot de Telegram
+        mensaje_alerta: Mensaje a enviar
+        nivel_alerta: Nivel de riesgo de la alerta
+        
+    Returns:
+        tuple: (enviados, errores)
+    """
+    partes_alerta = dividir_mensaje(mensaje_alerta)
+    semaforo = asyncio.Semaphore(ENVIOS_SIMULTANEOS)
+    
+    notificados = []
+    fallidos = []
+    
+    async for lote in db_async.iterar_suscriptores_activos():
+        logger.info(f"📤 Enviando alertas a {len(lote)} suscriptores...")
+        
+        resultados = await asyncio.gather(
+            *(enviar_mensaje(bot, chat_id, partes_alerta, semaforo) for chat_id in lote)
+        )
+        for chat_id, entregadas in zip(lote, resultados):
+            if entregadas == len(partes_alerta):
+                notificados.append(chat_id)
+            else:
+                fallidos.append((chat_id, entregadas))
+    
+    if not notificados and not fallidos:
+        return 0, 0
+    
+    # Incrementar contadores y registrar en historial en una sola transacción
+    await db_async.registrar_envio_alertas(
+        chat_ids=notificados,
+        nivel_riesgo=nivel_alerta,
+        mensaje=mensaje_alerta[:200],  # Solo primeros 200 caracteres
+        usuarios_notificados=len(notificados),
+        exito=not fallidos
+    )
+    
+    # Guardar los fallidos (con las partes ya entregadas) para reintentarlos más tarde
+    if fallidos:
+        await db_async.guardar_envios_pendientes(fallidos, mensaje_alerta)
+    
+    return len(notificados), len(fallidos)
 
 
 async def revisar_y_enviar_alertas(bot: Bot):
@@ -39,9 +131,11 @@ async def revisar_y_enviar_alertas(bot: Bot):
     logger.info("=" * 60)
     
     try:
-        # Obtener predicción actual
+        # Obtener predicción actual sin pasar por el caché del notificador; el
+        # predictor reutiliza su predicción de la fecha si ya la calculó
         logger.info("🔮 Obteniendo predicción...")
-        prediccion = notificador.obtener_prediccion_actual()
+        notificador.invalidar_cache()
+        prediccion = await notificador.obtener_prediccion_actual_async()
         
         if "error" in prediccion:
             logger.error(f"❌ Error en predicción: {prediccion['error']}")
@@ -63,60 +157,32 @@ async def revisar_y_enviar_alertas(bot: Bot):
         
         logger.warning(f"⚠️ RIESGO DE HELADA DETECTADO: {riesgo} (Temp: {temp:.1f}°C)")
         
-        # Obtener suscriptores activos
-        suscriptores = db.obtener_suscriptores_activos()
-        
-        if not suscriptores:
-            logger.info("📭 No hay suscriptores activos para notificar")
+        # No repetir la misma alerta en cada horario si la predicción no cambió
+        if not notificador.alerta_es_nueva(prediccion):
+            logger.info("🔁 Esta alerta ya se envió, no se repite")
             logger.info("=" * 60)
             return
         
-        logger.info(f"📤 Enviando alertas a {len(suscriptores)} suscriptores...")
-        
-        # Generar mensaje de alerta
+        # Generar mensaje de alerta (una sola vez para todos los suscriptores)
         mensaje_alerta = notificador.formatear_mensaje_alerta(prediccion)
         
-        # Enviar alertas a todos los suscriptores
-        enviados = 0
-        errores = 0
-        
-        for chat_id in suscriptores:
-            try:
-                await bot.send_message(
-                    chat_id=chat_id,
-                    text=mensaje_alerta,
-                    parse_mode='Markdown'
-                )
-                
-                # Incrementar contador de alertas del usuario
-                db.incrementar_contador_alertas(chat_id)
-                enviados += 1
-                
-                # Pequeña pausa para evitar rate limiting
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"❌ Error enviando alerta a {chat_id}: {e}")
-                errores += 1
+        enviados, errores = await enviar_broadcast(bot, mensaje_alerta, nivel_alerta)
         
-        # Registrar en historial
-        db.registrar_alerta_enviada(
-            nivel_riesgo=nivel_alerta,
-            mensaje=mensaje_alerta[:200],  # Solo primeros 200 caracteres
-            usuarios_notificados=enviados,
-            exito=(errores == 0)
-        )
-        
-        logger.info(f"✅ Alertas enviadas exitosamente: {enviados}")
-        if errores > 0:
-            logger.warning(f"⚠️ Errores al enviar: {errores}")
+        if enviados + errores == 0:
+            logger.info("📭 No hay suscriptores activos para notificar")
+        else:
+            logger.info(f"✅ Alertas enviadas exitosamente: {enviados}")
+            if errores > 0:
+                logger.warning(f"⚠️ Errores al enviar: {errores}")
+            
+            # Solo tras completar el envío (los fallidos quedaron pendientes de reintento)
+            clave = notificador.marcar_alerta_enviada(prediccion)
+            await db_async.guardar_estado('ultima_alerta', clave)
         
         logger.info("=" * 60)
         
-    except Exception as e:
-        logger.error(f"❌ Error en revisión automática: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("❌ Error en revisión automática")
         logger.info("=" * 60)
 
 
@@ -125,6 +191,43 @@ async def tarea_programada(context):
     await revisar_y_enviar_alertas(context.bot)
 
 
+async def reintentar_envios_pendientes(bot: Bot):
+    """
+    Reintenta las alertas que fallaron en envíos anteriores
+    Las que caducaron o agotaron sus intentos se descartan en la base de datos
+    """
+    pendientes = await db_async.obtener_envios_pendientes()
+    
+    if not pendientes:
+        return
+    
+    logger.info(f"🔁 Reintentando {len(pendientes)} alertas pendientes...")
+    
+    # Solo se reenvían las partes que el chat aún no recibió
+    restantes = [dividir_mensaje(mensaje)[partes_enviadas:] for _, mensaje, partes_enviadas in pendientes]
+    
+    semaforo = asyncio.Semaphore(ENVIOS_SIMULTANEOS)
+    resultados = await asyncio.gather(
+        *(enviar_mensaje(bot, chat_id, partes, semaforo) for (chat_id, _, _), partes in zip(pendientes, restantes))
+    )
+    
+    enviados = []
+    fallidos = []
+    for (chat_id, _, partes_enviadas), partes, entregadas in zip(pendientes, restantes, resultados):
+        if entregadas == len(partes):
+            enviados.append(chat_id)
+        else:
+            fallidos.append((chat_id, partes_enviadas + entregadas))
+    await db_async.resolver_envios_pendientes(enviados, fallidos)
+    
+    logger.info(f"🔁 Reintentos: {len(enviados)} enviadas, {len(fallidos)} fallidas")
+
+
+async def tarea_reintentos(context):
+    """Callback para el reintento periódico de alertas pendientes"""
+    await reintentar_envios_pendientes(context.bot)
+
+
 def configurar_automatizacion(application: Application):
     """
     Configura las tareas programadas de alertas
@@ -151,6 +254,13 @@ def configurar_automatizacion(application: Application):
         except Exception as e:
             logger.error(f"   ❌ Error programando {horario}: {e}")
     
+    job_queue.run_repeating(
+        tarea_reintentos,
+        interval=INTERVALO_REINTENTO_PENDIENTES,
+        name="reintento_pendientes"
+    )
+    logger.info(f"   ✅ Reintento de pendientes cada {INTERVALO_REINTENTO_PENDIENTES // 60} min")
+    
     logger.info("✅ Tareas programadas configuradas correctamente")
 
 
@@ -2,7 +2,11 @@
 Configuración del bot de alertas de heladas - Madrid, Cundinamarca
 """
 
+import atexit
+import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -16,6 +20,14 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8554319495:AAF3-CmsOZk9QiP
 # Base de datos
 DB_PATH = '../suscriptores.db'
 
+# Modo webhook (opcional): si se define WEBHOOK_URL el bot recibe las
+# actualizaciones por webhook en lugar de long polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+
+# Segundos que Telegram retiene cada getUpdates esperando mensajes (long polling)
+POLLING_TIMEOUT = 30
+
 # ============================================================
 # UMBRALES DE TEMPERATURA (según tu predictor.py)
 # ============================================================
@@ -32,6 +44,21 @@ UMBRALES = {
 # Horarios en formato 24h para revisar predicción y enviar alertas
 HORARIOS_CHEQUEO = ['06:00', '18:00', '22:00']  # Mañana, tarde y noche
 
+# Segundos que se reutiliza la última predicción antes de recalcularla
+PREDICTION_TTL = int(os.getenv('PREDICTION_TTL', 300))
+
+# Segundos de espera antes de reintentar cargar el predictor tras un fallo
+REINTENTO_PREDICTOR = 300
+
+# Envíos simultáneos de alertas (Telegram admite ~30 mensajes/segundo)
+ENVIOS_SIMULTANEOS = 25
+
+# Intentos por mensaje cuando Telegram pide esperar (RetryAfter)
+REINTENTOS_ENVIO = 3
+
+# Cada cuántos segundos se reintentan las alertas que fallaron
+INTERVALO_REINTENTO_PENDIENTES = 15 * 60
+
 # ============================================================
 # MENSAJES DEL BOT
 # ============================================================
@@ -152,4 +179,37 @@ Para reportar problemas o sugerencias, contacta al administrador del sistema.
 # CONFIGURACIÓN DE LOGGING
 # ============================================================
 LOG_LEVEL = 'INFO'
-LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
\ No newline at end of file
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_ARCHIVO = 'logs_alertas.txt'
+LOG_MAX_BYTES = 5_000_000
+LOG_BACKUPS = 3
+
+
+def configurar_logging():
+    """
+    Configura el logging del bot: archivo rotativo + consola
+    
+    Los módulos solo encolan los registros (QueueHandler); un hilo de fondo
+    (QueueListener) los escribe en disco, así el event loop nunca espera al
+    archivo. Llamarla más de una vez no duplica los handlers.
+    """
+    raiz = logging.getLogger()
+    if any(isinstance(h, QueueHandler) for h in raiz.handlers):
+        return
+    
+    formato = logging.Formatter(LOG_FORMAT)
+    archivo = RotatingFileHandler(LOG_ARCHIVO, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    consola = logging.StreamHandler()
+    archivo.setFormatter(formato)
+    consola.setFormatter(formato)
+    
+    # El formato final lo aplican los handlers del listener; en la cola solo el mensaje
+    cola = queue.Queue(-1)
+    encolador = QueueHandler(cola)
+    encolador.setFormatter(logging.Formatter('%(message)s'))
+    listener = QueueListener(cola, archivo, consola, respect_handler_level=True)
+    logging.basicConfig(level=LOG_LEVEL, handlers=[encolador])
+    listener.start()
+    
+    # Vaciar la cola al terminar el proceso
+    atexit.register(listener.stop)
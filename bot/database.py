@@ -4,13 +4,67 @@ Sistema de gestión de base de datos para suscriptores del bot de Telegram
 Usa SQLite para almacenar información de usuarios y sus suscripciones
 """
 
+import asyncio
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Consultas frecuentes: siempre el mismo texto para que sqlite3 reutilice
+# la sentencia ya compilada desde su caché
+SQL_ESTA_SUSCRITO = 'SELECT 1 FROM suscriptores WHERE chat_id = ? AND activo = 1 LIMIT 1'
+SQL_SUSCRIPTORES_ACTIVOS = 'SELECT chat_id FROM suscriptores WHERE activo = 1'
+SQL_LOTE_SUSCRIPTORES_ACTIVOS = '''
+    SELECT chat_id FROM suscriptores
+    WHERE activo = 1 AND chat_id > ?
+    ORDER BY chat_id
+    LIMIT ?
+'''
+SQL_INFO_SUSCRIPTOR = 'SELECT * FROM suscriptores WHERE chat_id = ?'
+SQL_AGREGAR_SUSCRIPTOR = '''
+    INSERT INTO suscriptores (chat_id, username, nombre, activo)
+    VALUES (?, ?, ?, 1)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        username = excluded.username,
+        nombre = excluded.nombre,
+        activo = 1
+'''
+SQL_ACTUALIZAR_ESTADO = 'UPDATE suscriptores SET activo = ? WHERE chat_id = ?'
+SQL_INCREMENTAR_CONTADOR = '''
+    UPDATE suscriptores 
+    SET alertas_recibidas = alertas_recibidas + 1,
+        ultima_alerta = CURRENT_TIMESTAMP
+    WHERE chat_id = ?
+'''
+
+
+# Máximo de parámetros por cláusula IN (SQLite antiguo admite 999 por sentencia)
+MAX_PARAMETROS_IN = 500
+
+
+def _en_lotes(ids: List[int], tamano: int = MAX_PARAMETROS_IN) -> Iterator[List[int]]:
+    """Divide una lista de IDs en lotes que caben en una cláusula IN"""
+    ids = list(ids)
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+
+def _sql_incrementar_contadores(cantidad: int) -> str:
+    """UPDATE que incrementa el contador de `cantidad` chat_ids con una sola sentencia"""
+    marcadores = ','.join('?' * cantidad)
+    return f'''
+        UPDATE suscriptores 
+        SET alertas_recibidas = alertas_recibidas + 1,
+            ultima_alerta = CURRENT_TIMESTAMP
+        WHERE chat_id IN ({marcadores})
+    '''
+
 
 class DatabaseManager:
     """Gestor de base de datos para suscriptores"""
@@ -23,12 +77,90 @@ class DatabaseManager:
             db_path: Ruta al archivo de base de datos SQLite
         """
         self.db_path = db_path
+        
+        # Una conexión reutilizable por hilo (mantiene caliente el caché de páginas);
+        # una base ':memory:' solo existe dentro de su conexión, así que se comparte
+        self._local = threading.local()
+        self._conexiones = []
+        self._lock_conexiones = threading.Lock()
+        self._lock_escritura = threading.RLock()
+        self._conexion_compartida = None
+        if self.db_path == ':memory:':
+            self._conexion_compartida = self._nueva_conexion()
+        
         self.crear_tablas()
     
     def conectar(self) -> sqlite3.Connection:
-        """Crear conexión a la base de datos"""
-        conn = sqlite3.connect(self.db_path)
+        """Obtener la conexión a la base de datos del hilo actual (se crea la primera vez)"""
+        if self._conexion_compartida is not None:
+            return self._conexion_compartida
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._nueva_conexion()
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _transaccion(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transacción de escritura: commit al salir o rollback si hay error
+        
+        Las escrituras del proceso se serializan con un lock, de modo que los
+        hilos esperan su turno en lugar de competir por el bloqueo de SQLite;
+        las lecturas sobre archivo no lo toman y en WAL siguen en paralelo.
+        """
+        with self._lock_escritura:
+            conn = self.conectar()
+            with conn:
+                yield conn
+    
+    @contextmanager
+    def _lectura(self) -> Iterator[sqlite3.Connection]:
+        """
+        Conexión para una consulta de lectura
+        
+        La conexión compartida de ':memory:' la usan todos los hilos, así que
+        sus lecturas toman el mismo lock que las escrituras; con un archivo
+        cada hilo lee con su propia conexión y sin lock.
+        """
+        if self._conexion_compartida is not None:
+            with self._lock_escritura:
+                yield self._conexion_compartida
+        else:
+            yield self.conectar()
+    
+    def cerrar(self):
+        """Cerrar todas las conexiones abiertas por el gestor"""
+        with self._lock_conexiones:
+            for conn in self._conexiones:
+                # Refrescar estadísticas de índices antes de cerrar
+                try:
+                    conn.execute('PRAGMA optimize')
+                except sqlite3.Error:
+                    pass
+                conn.close()
+            self._conexiones.clear()
+        self._local = threading.local()
+        self._conexion_compartida = None
+    
+    def _nueva_conexion(self) -> sqlite3.Connection:
+        """Abrir y configurar una nueva conexión SQLite"""
+        # check_same_thread=False solo para poder cerrarla desde cerrar();
+        # cada hilo sigue usando únicamente su propia conexión
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
         conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
+        
+        # Ajustes por conexión: en WAL basta un fsync por checkpoint, y los
+        # escritores esperan al lock en vez de fallar con SQLITE_BUSY
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-20000')
+        conn.execute('PRAGMA mmap_size=134217728')
+        
+        with self._lock_conexiones:
+            self._conexiones.append(conn)
         return conn
     
     def crear_tablas(self):
@@ -36,6 +168,16 @@ class DatabaseManager:
         conn = self.conectar()
         cursor = conn.cursor()
         
+        if self.db_path != ':memory:':
+            # En un archivo nuevo, activar autovacuum incremental antes de crear
+            # tablas para que las páginas liberadas por DELETE puedan devolverse
+            if cursor.execute('PRAGMA page_count').fetchone()[0] == 0:
+                cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                cursor.execute('VACUUM')
+            
+            # WAL es persistente en el archivo: lectores y escritor no se bloquean
+            cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Tabla de suscriptores
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS suscriptores (
@@ -61,8 +203,43 @@ class DatabaseManager:
             )
         ''')
         
+        # Alertas cuyo envío falló, pendientes de reintento (una por chat)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS envios_pendientes (
+                chat_id INTEGER PRIMARY KEY,
+                mensaje TEXT,
+                intentos INTEGER DEFAULT 0,
+                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                partes_enviadas INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # Bases creadas antes de registrar las partes ya entregadas de cada envío
+        columnas = {row[1] for row in cursor.execute('PRAGMA table_info(envios_pendientes)')}
+        if 'partes_enviadas' not in columnas:
+            cursor.execute('ALTER TABLE envios_pendientes ADD COLUMN partes_enviadas INTEGER DEFAULT 0')
+        
+        # Estado del bot que debe sobrevivir a un reinicio (clave/valor)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS estado_bot (
+                clave TEXT PRIMARY KEY,
+                valor TEXT
+            )
+        ''')
+        
+        # Índice parcial (solo activos) para el envío masivo de alertas
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suscriptores_activos
+            ON suscriptores(activo, chat_id) WHERE activo = 1
+        ''')
+        
+        # Historial ordenado por fecha sin ordenar toda la tabla
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_historial_fecha
+            ON historial_alertas(fecha_envio DESC)
+        ''')
+        
         conn.commit()
-        conn.close()
         logger.info("Base de datos inicializada correctamente")
     
     def agregar_suscriptor(self, chat_id: int, username: str = None, nombre: str = None) -> bool:
@@ -78,22 +255,76 @@ class DatabaseManager:
             True si se agregó/actualizó correctamente
         """
         try:
-            conn = self.conectar()
-            cursor = conn.cursor()
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                # UPSERT: si ya existe se actualiza en su lugar, conservando
+                # fecha_registro y alertas_recibidas
+                cursor.execute(SQL_AGREGAR_SUSCRIPTOR, (chat_id, username, nombre))
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO suscriptores (chat_id, username, nombre, activo)
-                VALUES (?, ?, ?, 1)
-            ''', (chat_id, username, nombre))
-            
-            conn.commit()
-            conn.close()
             logger.info(f"Suscriptor {chat_id} agregado/actualizado")
             return True
-        except Exception as e:
+        except sqlite3.Error as e:
             logger.error(f"Error al agregar suscriptor: {e}")
             return False
     
+    def agregar_suscriptores_lote(self, suscriptores: List[Tuple[int, Optional[str], Optional[str]]]) -> int:
+        """
+        Agregar o actualizar varios suscriptores en una sola transacción
+        (útil para importaciones, migraciones o restauraciones)
+        
+        Args:
+            suscriptores: Tuplas (chat_id, username, nombre)
+            
+        Returns:
+            Cantidad de suscriptores agregados/actualizados
+        """
+        try:
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                # Un único executemany dentro de la transacción del with: todo el lote o nada
+                cursor.executemany(SQL_AGREGAR_SUSCRIPTOR, suscriptores)
+            
+            logger.info(f"{len(suscriptores)} suscriptores agregados/actualizados")
+            return len(suscriptores)
+        except sqlite3.Error as e:
+            logger.error(f"Error al agregar suscriptores: {e}")
+            return 0
+    
+    def ejecutar_escrituras(self, escrituras: List[Tuple[str, tuple]]) -> List[bool]:
+        """
+        Ejecutar varias escrituras independientes con un único commit
+        
+        Cada escritura va en su propio SAVEPOINT: si una falla se deshace solo
+        ella y el resto se confirma igualmente.
+        
+        Args:
+            escrituras: Tuplas (sql, parámetros)
+            
+        Returns:
+            Lista con True/False por escritura según se haya aplicado
+        """
+        resultados = []
+        try:
+            with self._transaccion() as conn:
+                conn.execute('BEGIN')
+                for sql, parametros in escrituras:
+                    conn.execute('SAVEPOINT escritura')
+                    try:
+                        conn.execute(sql, parametros)
+                        resultados.append(True)
+                    except sqlite3.Error as e:
+                        logger.error(f"Error en escritura encolada: {e}")
+                        conn.execute('ROLLBACK TO escritura')
+                        resultados.append(False)
+                    conn.execute('RELEASE escritura')
+        except sqlite3.Error as e:
+            logger.error(f"Error al confirmar escrituras encoladas: {e}")
+            return [False] * len(escrituras)
+        
+        return resultados
+    
     def esta_suscrito(self, chat_id: int) -> bool:
         """
         Verificar si un usuario está suscrito y activo
@@ -104,17 +335,12 @@ class DatabaseManager:
         Returns:
             True si está suscrito y activo
         """
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT activo FROM suscriptores WHERE chat_id = ?
-        ''', (chat_id,))
-        
-        resultado = cursor.fetchone()
-        conn.close()
-        
-        return resultado is not None and resultado['activo'] == 1
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(SQL_ESTA_SUSCRITO, (chat_id,))
+            
+            return cursor.fetchone() is not None
     
     def actualizar_estado_suscripcion(self, chat_id: int, activo: bool) -> bool:
         """
@@ -128,18 +354,14 @@ class DatabaseManager:
             True si se actualizó correctamente
         """
         try:
-            conn = self.conectar()
-            cursor = conn.cursor()
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(SQL_ACTUALIZAR_ESTADO, (1 if activo else 0, chat_id))
             
-            cursor.execute('''
-                UPDATE suscriptores SET activo = ? WHERE chat_id = ?
-            ''', (1 if activo else 0, chat_id))
-            
-            conn.commit()
-            conn.close()
             logger.info(f"Estado de suscripción actualizado para {chat_id}: {activo}")
             return True
-        except Exception as e:
+        except sqlite3.Error as e:
             logger.error(f"Error al actualizar estado de suscripción: {e}")
             return False
     
@@ -150,17 +372,47 @@ class DatabaseManager:
         Returns:
             Lista de IDs de chat activos
         """
-        conn = self.conectar()
-        cursor = conn.cursor()
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(SQL_SUSCRIPTORES_ACTIVOS)
+            
+            resultados = cursor.fetchall()
+            
+            return [row['chat_id'] for row in resultados]
+    
+    def obtener_lote_suscriptores_activos(self, despues_de: float = float('-inf'),
+                                          limite: int = 500) -> List[int]:
+        """
+        Obtener un lote de chat_ids activos ordenados, a partir de un chat_id dado
         
-        cursor.execute('''
-            SELECT chat_id FROM suscriptores WHERE activo = 1
-        ''')
+        Args:
+            despues_de: Último chat_id del lote anterior (excluido)
+            limite: Tamaño máximo del lote
+            
+        Returns:
+            Lista de IDs de chat activos (vacía al terminar)
+        """
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SQL_LOTE_SUSCRIPTORES_ACTIVOS, (despues_de, limite))
+            return [row['chat_id'] for row in cursor.fetchall()]
+    
+    def iterar_suscriptores_activos(self, tamano_lote: int = 500) -> Iterator[List[int]]:
+        """
+        Recorrer los suscriptores activos por lotes sin materializar la lista completa
         
-        resultados = cursor.fetchall()
-        conn.close()
+        Cada lote es una consulta independiente sobre el índice de activos
+        (paginación por chat_id), así que no se mantiene un cursor abierto
+        entre lotes.
         
-        return [row['chat_id'] for row in resultados]
+        Args:
+            tamano_lote: Cantidad de chat_ids por lote
+        """
+        lote = self.obtener_lote_suscriptores_activos(limite=tamano_lote)
+        while lote:
+            yield lote
+            lote = self.obtener_lote_suscriptores_activos(lote[-1], tamano_lote)
     
     def obtener_info_suscriptor(self, chat_id: int) -> Optional[Dict]:
         """
@@ -172,19 +424,16 @@ class DatabaseManager:
         Returns:
             Diccionario con información del suscriptor o None
         """
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM suscriptores WHERE chat_id = ?
-        ''', (chat_id,))
-        
-        resultado = cursor.fetchone()
-        conn.close()
-        
-        if resultado:
-            return dict(resultado)
-        return None
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(SQL_INFO_SUSCRIPTOR, (chat_id,))
+            
+            resultado = cursor.fetchone()
+            
+            if resultado:
+                return dict(resultado)
+            return None
     
     def incrementar_contador_alertas(self, chat_id: int):
         """
@@ -194,21 +443,32 @@ class DatabaseManager:
             chat_id: ID del chat de Telegram
         """
         try:
-            conn = self.conectar()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE suscriptores 
-                SET alertas_recibidas = alertas_recibidas + 1,
-                    ultima_alerta = CURRENT_TIMESTAMP
-                WHERE chat_id = ?
-            ''', (chat_id,))
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(SQL_INCREMENTAR_CONTADOR, (chat_id,))
+        except sqlite3.Error as e:
             logger.error(f"Error al incrementar contador de alertas: {e}")
     
+    def incrementar_contadores_alertas(self, chat_ids: List[int]):
+        """
+        Incrementar en una sola sentencia el contador de alertas de varios usuarios
+        
+        Args:
+            chat_ids: IDs de chat de Telegram que recibieron la alerta
+        """
+        if not chat_ids:
+            return
+        
+        try:
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                for lote in _en_lotes(chat_ids):
+                    cursor.execute(_sql_incrementar_contadores(len(lote)), lote)
+        except sqlite3.Error as e:
+            logger.error(f"Error al incrementar contadores de alertas: {e}")
+    
     def registrar_alerta_enviada(self, nivel_riesgo: str, mensaje: str, 
                                   usuarios_notificados: int, exito: bool = True):
         """
@@ -220,61 +480,229 @@ class DatabaseManager:
             usuarios_notificados: Cantidad de usuarios notificados
             exito: Si el envío fue exitoso
         """
-        try:
-            conn = self.conectar()
-            cursor = conn.cursor()
+        if self.registrar_alertas_lote([(nivel_riesgo, mensaje, usuarios_notificados, exito)]):
+            logger.info(f"Alerta registrada en historial: {nivel_riesgo}")
+    
+    def registrar_envio_alertas(self, chat_ids: List[int], nivel_riesgo: str, mensaje: str,
+                                usuarios_notificados: int, exito: bool = True) -> bool:
+        """
+        Registrar un envío completo en una sola transacción: incrementa los
+        contadores de los usuarios notificados y guarda la alerta en el historial
+        
+        Args:
+            chat_ids: IDs de chat de Telegram que recibieron la alerta
+            nivel_riesgo: Nivel de riesgo de la alerta (alto, medio, bajo)
+            mensaje: Contenido del mensaje enviado
+            usuarios_notificados: Cantidad de usuarios notificados
+            exito: Si el envío fue exitoso
             
-            cursor.execute('''
-                INSERT INTO historial_alertas 
-                (nivel_riesgo, mensaje, usuarios_notificados, exito)
-                VALUES (?, ?, ?, ?)
-            ''', (nivel_riesgo, mensaje, usuarios_notificados, 1 if exito else 0))
+        Returns:
+            True si se registró correctamente
+        """
+        try:
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                for lote in _en_lotes(chat_ids):
+                    cursor.execute(_sql_incrementar_contadores(len(lote)), lote)
+                
+                cursor.execute('''
+                    INSERT INTO historial_alertas 
+                    (nivel_riesgo, mensaje, usuarios_notificados, exito)
+                    VALUES (?, ?, ?, ?)
+                ''', (nivel_riesgo, mensaje, usuarios_notificados, 1 if exito else 0))
             
-            conn.commit()
-            conn.close()
             logger.info(f"Alerta registrada en historial: {nivel_riesgo}")
-        except Exception as e:
-            logger.error(f"Error al registrar alerta en historial: {e}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error al registrar envío de alertas: {e}")
+            return False
     
-    def obtener_estadisticas(self) -> Dict:
+    def registrar_alertas_lote(self, alertas: List[Tuple[str, str, int, bool]]) -> int:
         """
-        Obtener estadísticas generales del sistema
+        Registrar varias alertas en el historial en una sola transacción
         
+        Args:
+            alertas: Tuplas (nivel_riesgo, mensaje, usuarios_notificados, exito)
+            
         Returns:
-            Diccionario con estadísticas
+            Cantidad de alertas registradas
         """
-        conn = self.conectar()
-        cursor = conn.cursor()
+        try:
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany('''
+                    INSERT INTO historial_alertas 
+                    (nivel_riesgo, mensaje, usuarios_notificados, exito)
+                    VALUES (?, ?, ?, ?)
+                ''', [(nivel, msj, usuarios, 1 if ok else 0) for nivel, msj, usuarios, ok in alertas])
+            
+            return len(alertas)
+        except sqlite3.Error as e:
+            logger.error(f"Error al registrar alertas en historial: {e}")
+            return 0
+    
+    def guardar_envios_pendientes(self, fallidos: List[Tuple[int, int]], mensaje: str) -> int:
+        """
+        Guardar alertas que no se pudieron enviar para reintentarlas más tarde
+        
+        Si un chat ya tenía una alerta pendiente, se reemplaza por la nueva.
         
-        # Total de suscriptores
-        cursor.execute('SELECT COUNT(*) as total FROM suscriptores')
-        total_suscriptores = cursor.fetchone()['total']
+        Args:
+            fallidos: Tuplas (chat_id, partes ya entregadas) de los envíos que fallaron
+            mensaje: Mensaje completo a reenviar
+            
+        Returns:
+            Cantidad de envíos guardados
+        """
+        try:
+            with self._transaccion() as conn:
+                conn.executemany('''
+                    INSERT INTO envios_pendientes (chat_id, mensaje, partes_enviadas)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(chat_id) DO UPDATE SET
+                        mensaje = excluded.mensaje,
+                        partes_enviadas = excluded.partes_enviadas,
+                        intentos = 0,
+                        fecha_creacion = CURRENT_TIMESTAMP
+                ''', [(chat_id, mensaje, partes) for chat_id, partes in fallidos])
+            
+            return len(fallidos)
+        except sqlite3.Error as e:
+            logger.error(f"Error al guardar envíos pendientes: {e}")
+            return 0
+    
+    def obtener_envios_pendientes(self, horas: int = 6, max_intentos: int = 3) -> List[Tuple[int, str, int]]:
+        """
+        Obtener las alertas pendientes de reintento, descartando antes las
+        que ya caducaron, agotaron sus intentos o son de usuarios que se
+        dieron de baja o pausaron las alertas
         
-        # Suscriptores activos
-        cursor.execute('SELECT COUNT(*) as activos FROM suscriptores WHERE activo = 1')
-        suscriptores_activos = cursor.fetchone()['activos']
+        Args:
+            horas: Antigüedad máxima de una alerta pendiente
+            max_intentos: Reintentos fallidos tras los que se descarta
+            
+        Returns:
+            Lista de tuplas (chat_id, mensaje, partes ya entregadas)
+        """
+        with self._transaccion() as conn:
+            conn.execute('''
+                DELETE FROM envios_pendientes
+                WHERE intentos >= ?
+                OR datetime(fecha_creacion) < datetime('now', '-' || ? || ' hours')
+                OR chat_id NOT IN (SELECT chat_id FROM suscriptores WHERE activo = 1)
+            ''', (max_intentos, horas))
+        
+        with self._lectura() as conn:
+            cursor = conn.execute('SELECT chat_id, mensaje, partes_enviadas FROM envios_pendientes')
+            return [(row['chat_id'], row['mensaje'], row['partes_enviadas']) for row in cursor.fetchall()]
+    
+    def resolver_envios_pendientes(self, enviados: List[int], fallidos: List[Tuple[int, int]]):
+        """
+        Actualizar las alertas pendientes tras un reintento en una sola transacción:
+        las enviadas se eliminan (y cuentan como alerta recibida) y las
+        fallidas suman un intento
         
-        # Total de alertas enviadas
-        cursor.execute('SELECT COUNT(*) as total_alertas FROM historial_alertas')
-        total_alertas = cursor.fetchone()['total_alertas']
+        Args:
+            enviados: IDs de chat a los que se entregó la alerta
+            fallidos: Tuplas (chat_id, partes ya entregadas) cuyo reintento volvió a fallar
+        """
+        try:
+            with self._transaccion() as conn:
+                for lote in _en_lotes(enviados):
+                    marcadores = ','.join('?' * len(lote))
+                    conn.execute(
+                        f'DELETE FROM envios_pendientes WHERE chat_id IN ({marcadores})', lote
+                    )
+                    conn.execute(_sql_incrementar_contadores(len(lote)), lote)
+                
+                conn.executemany('''
+                    UPDATE envios_pendientes
+                    SET intentos = intentos + 1, partes_enviadas = ?
+                    WHERE chat_id = ?
+                ''', [(partes, chat_id) for chat_id, partes in fallidos])
+        except sqlite3.Error as e:
+            logger.error(f"Error al actualizar envíos pendientes: {e}")
+    
+    def obtener_estado(self, clave: str) -> Optional[str]:
+        """
+        Obtener un valor del estado persistente del bot
         
-        # Última alerta enviada
-        cursor.execute('''
-            SELECT fecha_envio, nivel_riesgo, usuarios_notificados 
-            FROM historial_alertas 
-            ORDER BY fecha_envio DESC 
-            LIMIT 1
-        ''')
-        ultima_alerta = cursor.fetchone()
+        Args:
+            clave: Nombre del valor
+            
+        Returns:
+            Valor guardado o None si no existe
+        """
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT valor FROM estado_bot WHERE clave = ?', (clave,))
+            
+            resultado = cursor.fetchone()
+            return resultado[0] if resultado else None
+    
+    def guardar_estado(self, clave: str, valor: str) -> bool:
+        """
+        Guardar (o reemplazar) un valor del estado persistente del bot
         
-        conn.close()
+        Args:
+            clave: Nombre del valor
+            valor: Valor a guardar
+            
+        Returns:
+            True si se guardó correctamente
+        """
+        try:
+            with self._transaccion() as conn:
+                conn.execute('''
+                    INSERT INTO estado_bot (clave, valor) VALUES (?, ?)
+                    ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+                ''', (clave, valor))
+            
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error al guardar estado '{clave}': {e}")
+            return False
+    
+    def obtener_estadisticas(self) -> Dict:
+        """
+        Obtener estadísticas generales del sistema
         
-        return {
-            'total_suscriptores': total_suscriptores,
-            'suscriptores_activos': suscriptores_activos,
-            'total_alertas_enviadas': total_alertas,
-            'ultima_alerta': dict(ultima_alerta) if ultima_alerta else None
-        }
+        Returns:
+            Diccionario con estadísticas
+        """
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            
+            # Conteos de ambas tablas en una sola consulta
+            cursor.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM suscriptores) AS total,
+                    (SELECT COUNT(*) FROM suscriptores WHERE activo = 1) AS activos,
+                    (SELECT COUNT(*) FROM historial_alertas) AS total_alertas
+            ''')
+            conteos = cursor.fetchone()
+            total_suscriptores = conteos['total']
+            suscriptores_activos = conteos['activos']
+            total_alertas = conteos['total_alertas']
+            
+            # Última alerta enviada
+            cursor.execute('''
+                SELECT fecha_envio, nivel_riesgo, usuarios_notificados 
+                FROM historial_alertas 
+                ORDER BY fecha_envio DESC 
+                LIMIT 1
+            ''')
+            ultima_alerta = cursor.fetchone()
+            
+            return {
+                'total_suscriptores': total_suscriptores,
+                'suscriptores_activos': suscriptores_activos,
+                'total_alertas_enviadas': total_alertas,
+                'ultima_alerta': dict(ultima_alerta) if ultima_alerta else None
+            }
     
     def obtener_historial_alertas(self, limite: int = 10) -> List[Dict]:
         """
@@ -286,19 +714,18 @@ class DatabaseManager:
         Returns:
             Lista de diccionarios con información de alertas
         """
-        conn = self.conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM historial_alertas 
-            ORDER BY fecha_envio DESC 
-            LIMIT ?
-        ''', (limite,))
-        
-        resultados = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in resultados]
+        with self._lectura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT * FROM historial_alertas 
+                ORDER BY fecha_envio DESC 
+                LIMIT ?
+            ''', (limite,))
+            
+            resultados = cursor.fetchall()
+            
+            return [dict(row) for row in resultados]
     
     def eliminar_suscriptor(self, chat_id: int) -> bool:
         """
@@ -311,16 +738,14 @@ class DatabaseManager:
             True si se eliminó correctamente
         """
         try:
-            conn = self.conectar()
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM suscriptores WHERE chat_id = ?', (chat_id,))
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('DELETE FROM suscriptores WHERE chat_id = ?', (chat_id,))
             
-            conn.commit()
-            conn.close()
             logger.info(f"Suscriptor {chat_id} eliminado de la base de datos")
             return True
-        except Exception as e:
+        except sqlite3.Error as e:
             logger.error(f"Error al eliminar suscriptor: {e}")
             return False
     
@@ -335,26 +760,190 @@ class DatabaseManager:
             Cantidad de suscriptores eliminados
         """
         try:
-            conn = self.conectar()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                DELETE FROM suscriptores 
-                WHERE activo = 0 
-                AND datetime(ultima_alerta) < datetime('now', '-' || ? || ' days')
-            ''', (dias,))
+            with self._transaccion() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    DELETE FROM suscriptores 
+                    WHERE activo = 0 
+                    AND datetime(ultima_alerta) < datetime('now', '-' || ? || ' days')
+                ''', (dias,))
+                
+                eliminados = cursor.rowcount
             
-            eliminados = cursor.rowcount
-            conn.commit()
-            conn.close()
+            # Devolver al sistema las páginas liberadas por el DELETE
+            cursor.execute('PRAGMA incremental_vacuum(1000)').fetchall()
             
             logger.info(f"Eliminados {eliminados} suscriptores inactivos")
             return eliminados
-        except Exception as e:
+        except sqlite3.Error as e:
             logger.error(f"Error al limpiar suscriptores inactivos: {e}")
             return 0
 
 
+class DatabaseManagerAsync:
+    """
+    Fachada asíncrona de DatabaseManager para los handlers del bot
+    
+    Cada consulta se ejecuta en un hilo del executor (con su propia conexión
+    reutilizable), de modo que el event loop no se bloquea esperando a SQLite.
+    
+    El estado de suscripción (esta_suscrito) se guarda en memoria durante
+    `ttl_cache` segundos y se invalida cuando el propio bot lo modifica.
+    
+    Las altas y los cambios de estado de los comandos pasan por una cola que
+    atiende un único hilo escritor: las que se acumulan mientras se procesa
+    un lote se confirman juntas en la siguiente transacción.
+    """
+    
+    MAX_CACHE = 10000
+    MAX_LOTE_ESCRITURAS = 100
+    
+    def __init__(self, db: DatabaseManager, ttl_cache: float = 60):
+        """
+        Args:
+            db: Gestor síncrono sobre el que se delegan las consultas
+            ttl_cache: Segundos de validez del estado de suscripción en caché
+        """
+        self.db = db
+        self.ttl_cache = ttl_cache
+        self._cache_suscritos: Dict[int, Tuple[float, bool]] = {}
+        # Se incrementa con cada cambio confirmado: una lectura que empezó
+        # antes del cambio no debe guardar en caché el estado anterior
+        self._generacion_suscritos = 0
+        
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-escritor')
+        self._loop_escrituras = None
+        self._cola_escrituras = None
+        self._tarea_escrituras = None
+    
+    async def _escribir(self, sql: str, parametros: tuple) -> bool:
+        """Encolar una escritura para el hilo escritor y esperar a que se confirme"""
+        loop = asyncio.get_running_loop()
+        if self._loop_escrituras is not loop:
+            self._loop_escrituras = loop
+            self._cola_escrituras = asyncio.Queue()
+            self._tarea_escrituras = loop.create_task(self._procesar_escrituras())
+        
+        futuro = loop.create_future()
+        await self._cola_escrituras.put((sql, parametros, futuro))
+        return await futuro
+    
+    async def _procesar_escrituras(self):
+        """Tarea de fondo: confirma en una sola transacción todo lo que haya en la cola"""
+        cola = self._cola_escrituras
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await cola.get()]
+            while not cola.empty() and len(lote) < self.MAX_LOTE_ESCRITURAS:
+                lote.append(cola.get_nowait())
+            
+            escrituras = [(sql, parametros) for sql, parametros, _ in lote]
+            try:
+                resultados = await loop.run_in_executor(self._escritor, self.db.ejecutar_escrituras, escrituras)
+            except Exception as e:
+                logger.error(f"Error en el hilo escritor: {e}")
+                resultados = [False] * len(lote)
+            
+            for (_, _, futuro), resultado in zip(lote, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+                cola.task_done()
+    
+    async def cerrar(self):
+        """
+        Confirmar las escrituras encoladas, detener el hilo escritor y cerrar
+        las conexiones (llamar al apagar el bot)
+        """
+        if self._tarea_escrituras is not None:
+            await self._cola_escrituras.join()
+            self._tarea_escrituras.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._tarea_escrituras
+            self._tarea_escrituras = None
+            self._loop_escrituras = None
+        
+        self._escritor.shutdown(wait=True)
+        await asyncio.to_thread(self.db.cerrar)
+    
+    def _invalidar_suscrito(self, chat_id: int):
+        """Descartar el estado en caché tras confirmar un cambio de suscripción"""
+        self._cache_suscritos.pop(chat_id, None)
+        self._generacion_suscritos += 1
+    
+    async def agregar_suscriptor(self, chat_id: int, username: str = None, nombre: str = None) -> bool:
+        resultado = await self._escribir(SQL_AGREGAR_SUSCRIPTOR, (chat_id, username, nombre))
+        self._invalidar_suscrito(chat_id)
+        if resultado:
+            logger.info(f"Suscriptor {chat_id} agregado/actualizado")
+        return resultado
+    
+    async def esta_suscrito(self, chat_id: int) -> bool:
+        ahora = time.monotonic()
+        en_cache = self._cache_suscritos.get(chat_id)
+        if en_cache is not None and ahora - en_cache[0] < self.ttl_cache:
+            return en_cache[1]
+        
+        generacion = self._generacion_suscritos
+        suscrito = await asyncio.to_thread(self.db.esta_suscrito, chat_id)
+        if generacion != self._generacion_suscritos:
+            return suscrito
+        
+        if len(self._cache_suscritos) >= self.MAX_CACHE:
+            self._cache_suscritos.clear()
+        self._cache_suscritos[chat_id] = (ahora, suscrito)
+        return suscrito
+    
+    async def actualizar_estado_suscripcion(self, chat_id: int, activo: bool) -> bool:
+        resultado = await self._escribir(SQL_ACTUALIZAR_ESTADO, (1 if activo else 0, chat_id))
+        self._invalidar_suscrito(chat_id)
+        if resultado:
+            logger.info(f"Estado de suscripción actualizado para {chat_id}: {activo}")
+        return resultado
+    
+    async def obtener_suscriptores_activos(self) -> List[int]:
+        return await asyncio.to_thread(self.db.obtener_suscriptores_activos)
+    
+    async def iterar_suscriptores_activos(self, tamano_lote: int = 500) -> AsyncIterator[List[int]]:
+        lote = await asyncio.to_thread(self.db.obtener_lote_suscriptores_activos, float('-inf'), tamano_lote)
+        while lote:
+            yield lote
+            lote = await asyncio.to_thread(self.db.obtener_lote_suscriptores_activos, lote[-1], tamano_lote)
+    
+    async def obtener_info_suscriptor(self, chat_id: int) -> Optional[Dict]:
+        return await asyncio.to_thread(self.db.obtener_info_suscriptor, chat_id)
+    
+    async def incrementar_contadores_alertas(self, chat_ids: List[int]):
+        return await asyncio.to_thread(self.db.incrementar_contadores_alertas, chat_ids)
+    
+    async def registrar_alerta_enviada(self, nivel_riesgo: str, mensaje: str,
+                                       usuarios_notificados: int, exito: bool = True):
+        return await asyncio.to_thread(
+            self.db.registrar_alerta_enviada, nivel_riesgo, mensaje, usuarios_notificados, exito
+        )
+    
+    async def registrar_envio_alertas(self, chat_ids: List[int], nivel_riesgo: str, mensaje: str,
+                                      usuarios_notificados: int, exito: bool = True) -> bool:
+        return await asyncio.to_thread(
+            self.db.registrar_envio_alertas, chat_ids, nivel_riesgo, mensaje, usuarios_notificados, exito
+        )
+    
+    async def guardar_envios_pendientes(self, fallidos: List[Tuple[int, int]], mensaje: str) -> int:
+        return await asyncio.to_thread(self.db.guardar_envios_pendientes, fallidos, mensaje)
+    
+    async def obtener_envios_pendientes(self, horas: int = 6, max_intentos: int = 3) -> List[Tuple[int, str, int]]:
+        return await asyncio.to_thread(self.db.obtener_envios_pendientes, horas, max_intentos)
+    
+    async def resolver_envios_pendientes(self, enviados: List[int], fallidos: List[Tuple[int, int]]):
+        return await asyncio.to_thread(self.db.resolver_envios_pendientes, enviados, fallidos)
+    
+    async def guardar_estado(self, clave: str, valor: str) -> bool:
+        return await asyncio.to_thread(self.db.guardar_estado, clave, valor)
+    
+    async def obtener_estadisticas(self) -> Dict:
+        return await asyncio.to_thread(self.db.obtener_estadisticas)
+
+
 # Función de prueba
 if __name__ == "__main__":
     # Configurar logging
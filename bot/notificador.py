@@ -3,10 +3,14 @@ Módulo de notificaciones - Envío de alertas de heladas
 Integrado con el predictor de Machine Learning
 """
 
+import asyncio
 import logging
 import sys
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
 
 # ============================================================
 # CONFIGURAR PATH PARA IMPORTAR PREDICTOR
@@ -15,16 +19,122 @@ current_dir = Path(__file__).resolve().parent
 parent_dir = current_dir.parent
 sys.path.insert(0, str(parent_dir))
 
-# Importar predictor desde app/
-try:
-    from app.predictor_multiestacion import PredictorHeladasMulti
-except ImportError as e:
-    raise ImportError(f"No se pudo importar predictor desde {parent_dir}: {e}")
+# El predictor (pandas, scikit-learn, modelos) se importa y carga en el primer
+# uso, no al importar este módulo: comandos como /ayuda no lo necesitan
 
-from config import UMBRALES
+from config import UMBRALES, PREDICTION_TTL, REINTENTO_PREDICTOR
 
 logger = logging.getLogger(__name__)
 
+MESES_ES = (
+    None, 'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+    'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+)
+
+# Plantillas de mensajes, definidas una sola vez al cargar el módulo
+PLANTILLA_ALERTA = """
+{emoji} **ALERTA DE HELADA**
+📍 **Madrid, Cundinamarca**
+📅 **Fecha**: {fecha}
+🌡️ **Temperatura predicha**: {temp:.1f}°C
+❄️ **Probabilidad de helada**: {prob:.1f}%
+🔎 **Nivel de riesgo**: {riesgo}
+"""
+
+PLANTILLA_PREDICCION = """
+{emoji} Predicción de Heladas para Madrid, Cundinamarca
+📅 Mañana: {fecha}
+🌡️ Temperatura Mínima predicha: {temp:.1f}°C
+❄️ Probabilidad de helada: {prob:.1f}%
+🔎 Nivel de riesgo: {riesgo}
+
+🕐 Actualizado: {hora}
+"""
+
+# Métodos .format ya enlazados: cada mensaje solo sustituye los campos variables
+_renderizar_alerta = PLANTILLA_ALERTA.format
+_renderizar_prediccion = PLANTILLA_PREDICCION.format
+
+
+@lru_cache(maxsize=64)
+def _decidir_alerta(temp):
+    """(debe_enviar, nivel_alerta) para una temperatura predicha"""
+    if temp <= UMBRALES['alto']: # <= 0°C
+        return True, "ALTO"
+    elif temp <= UMBRALES['medio']: # <= 2°C
+        return True, "MEDIO"
+    else:
+        return False, None
+
+
+def _formatear_fecha(fecha):
+    """Fecha (date o datetime) como texto legible: '5 de marzo de 2025'"""
+    return f"{fecha.day} de {MESES_ES[fecha.month]} de {fecha.year}"
+
+
+# Límite de Telegram por mensaje (en unidades UTF-16), con margen
+LIMITE_MENSAJE = 4000
+
+
+def _largo_utf16(texto):
+    """Largo del texto tal como lo cuenta Telegram (unidades UTF-16)"""
+    return len(texto.encode('utf-16-le')) // 2
+
+
+def _posicion_corte(linea, limite):
+    """Cantidad de caracteres iniciales de la línea que caben en `limite` unidades UTF-16"""
+    largo = 0
+    for i, caracter in enumerate(linea):
+        largo += 2 if ord(caracter) > 0xFFFF else 1
+        if largo > limite:
+            return i
+    return len(linea)
+
+
+def dividir_mensaje(texto, limite=LIMITE_MENSAJE):
+    """
+    Divide un mensaje en partes que respetan el límite de Telegram,
+    cortando en saltos de línea siempre que sea posible
+    
+    Args:
+        texto: Mensaje completo
+        limite: Largo máximo de cada parte (unidades UTF-16)
+        
+    Returns:
+        list: Partes del mensaje (una sola si ya cabe)
+    """
+    # Cada carácter ocupa como mucho 2 unidades UTF-16: caso habitual sin recorrer el texto
+    if 2 * len(texto) <= limite or _largo_utf16(texto) <= limite:
+        return [texto]
+    
+    partes = []
+    actual = []
+    largo_actual = 0
+    for linea in texto.split('\n'):
+        largo = _largo_utf16(linea)
+        
+        # Línea que por sí sola excede el límite: se corta por caracteres
+        while largo > limite:
+            corte = _posicion_corte(linea, limite)
+            if actual:
+                partes.append('\n'.join(actual))
+                actual, largo_actual = [], 0
+            partes.append(linea[:corte])
+            linea = linea[corte:]
+            largo = _largo_utf16(linea)
+        
+        # +1 por el salto de línea que une la línea con la parte actual
+        if actual and largo_actual + 1 + largo > limite:
+            partes.append('\n'.join(actual))
+            actual, largo_actual = [], 0
+        
+        largo_actual += largo + (1 if actual else 0)
+        actual.append(linea)
+    
+    if actual:
+        partes.append('\n'.join(actual))
+    return partes
+
 
 class NotificadorHeladas:
     """
@@ -32,20 +142,55 @@ class NotificadorHeladas:
     Integrado con el sistema de predicción ML multi-estación
     """
    
-    def __init__(self, estacion_default="21205880"):
+    def __init__(self, estacion_default="21205880", ultima_alerta=None):
         """
-        Inicializa el notificador y el predictor
+        Inicializa el notificador
+        
+        El predictor (modelos + CSV) se carga en el primer uso, así importar el
+        módulo es barato. El bot lo usa por primera vez en segundo plano al
+        arrancar (ver telegram_bot.post_init); si la carga falla, no se
+        reintenta hasta pasados REINTENTO_PREDICTOR segundos.
         
         Args:
             estacion_default: Código de la estación para mostrar (default: Madrid/Flores Chibcha)
+            ultima_alerta: Clave de la última alerta enviada (ver clave_alerta), si se conoce
         """
         self.estacion_default = estacion_default
-        try:
-            self.predictor = PredictorHeladasMulti()
-            logger.info("✅ Predictor de heladas inicializado")
-        except Exception as e:
-            logger.error(f"❌ Error al inicializar predictor: {e}")
-            self.predictor = None
+        self.ultima_alerta = ultima_alerta
+        
+        # Caché de la última predicción formateada (segundos de validez)
+        self._cache = None
+        self._cache_ts = 0.0
+        self._cache_ttl = PREDICTION_TTL
+        self._lock_cache = threading.Lock()
+        
+        # Cálculo asíncrono en curso, compartido por las consultas concurrentes
+        self._en_curso = None
+        
+        self._predictor = None
+        self._lock_predictor = threading.Lock()
+        self._fallo_predictor = None  # instante (monotonic) del último fallo de carga
+    
+    @property
+    def predictor(self):
+        """Predictor de heladas, creado en el primer uso (None si no se pudo inicializar)"""
+        if self._predictor is None and not self._en_espera_predictor():
+            with self._lock_predictor:
+                if self._predictor is None and not self._en_espera_predictor():
+                    try:
+                        from app.predictor_multiestacion import PredictorHeladasMulti
+                        self._predictor = PredictorHeladasMulti()
+                        self._fallo_predictor = None
+                        logger.info("✅ Predictor de heladas inicializado")
+                    except Exception:
+                        self._fallo_predictor = time.monotonic()
+                        logger.exception(f"❌ Error al inicializar predictor; se reintentará en {REINTENTO_PREDICTOR}s")
+        return self._predictor
+    
+    def _en_espera_predictor(self):
+        """True si la última carga del predictor falló hace menos de REINTENTO_PREDICTOR segundos"""
+        return (self._fallo_predictor is not None
+                and time.monotonic() - self._fallo_predictor < REINTENTO_PREDICTOR)
    
     def obtener_prediccion_actual(self):
         """
@@ -56,7 +201,68 @@ class NotificadorHeladas:
         """
         if self.predictor is None:
             return {"error": "Predictor no disponible"}
-       
+        
+        en_cache = self.prediccion_en_cache()
+        if en_cache is not None:
+            return en_cache
+        
+        # Un solo cálculo a la vez: las consultas que llegan mientras tanto
+        # esperan y reutilizan el resultado recién guardado
+        with self._lock_cache:
+            en_cache = self.prediccion_en_cache()
+            if en_cache is not None:
+                return en_cache
+            return self._calcular_prediccion_actual()
+    
+    async def obtener_prediccion_actual_async(self):
+        """
+        Versión asíncrona de obtener_prediccion_actual para los handlers del bot
+        
+        El cálculo se hace en un hilo; si llegan varias consultas mientras
+        tanto, todas esperan el mismo cálculo en lugar de lanzar uno cada una.
+        
+        Returns:
+            dict: Predicción con temperatura, probabilidad, riesgo, etc.
+        """
+        en_cache = self.prediccion_en_cache()
+        if en_cache is not None:
+            return en_cache
+        
+        if self._en_curso is None:
+            self._en_curso = asyncio.ensure_future(asyncio.to_thread(self.obtener_prediccion_actual))
+            self._en_curso.add_done_callback(self._fin_calculo)
+        
+        # shield: si se cancela una consulta, el cálculo compartido sigue
+        return await asyncio.shield(self._en_curso)
+    
+    def _fin_calculo(self, tarea):
+        self._en_curso = None
+    
+    def prediccion_en_cache(self):
+        """
+        Devuelve la predicción en caché si sigue vigente, sin calcular nada
+        
+        Returns:
+            dict o None si no hay predicción vigente
+        """
+        if self._cache is not None and time.monotonic() - self._cache_ts < self._cache_ttl:
+            return self._cache
+        return None
+    
+    def invalidar_cache(self):
+        """
+        Marca la predicción en caché como vencida para que la próxima consulta
+        la vuelva a pedir al predictor
+        
+        No toma _lock_cache (que se mantiene durante todo un cálculo), así que
+        puede llamarse desde el event loop sin bloquearlo.
+        """
+        self._cache_ts = float('-inf')
+   
+    def _calcular_prediccion_actual(self):
+        """Calcula la predicción de la estación default y la guarda en caché"""
+        ahora = time.monotonic()
+        
         try:
             # Obtener predicción multi-estación
             resultado_multi = self.predictor.predecir()
@@ -80,14 +286,8 @@ class NotificadorHeladas:
                 print("❌ DEBUG: Lista de predicciones vacía")
                 return {"error": "No hay predicciones disponibles"}
             
-            # Buscar la estación específica
-            pred_estacion = None
-            for pred in predicciones:
-                print(f"🔍 DEBUG: Comparando '{pred['codigo']}' con '{self.estacion_default}'")
-                if pred["codigo"] == self.estacion_default:
-                    pred_estacion = pred
-                    print(f"✅ DEBUG: Estación encontrada!")
-                    break
+            # Buscar la estación específica en el índice por código del predictor
+            pred_estacion = resultado_multi["predicciones_por_codigo"].get(self.estacion_default)
             
             # Si no se encuentra, usar la primera disponible
             if pred_estacion is None:
@@ -95,22 +295,58 @@ class NotificadorHeladas:
                 print(f"⚠️ DEBUG: Estación {self.estacion_default} no encontrada, usando {pred_estacion['codigo']}")
                 logger.warning(f"Estación {self.estacion_default} no encontrada, usando {pred_estacion['codigo']}")
             
-            # Formatear respuesta compatible con el formato anterior
-            return {
-                "temperatura_predicha": pred_estacion["temperatura_predicha"],
-                "probabilidad_helada": pred_estacion["probabilidad_helada"],
-                "riesgo": pred_estacion["riesgo"],
-                "emoji_riesgo": pred_estacion["emoji_riesgo"],
-                "fecha_prediccion": resultado_multi["fecha_prediccion"],
-                "estacion_nombre": pred_estacion["nombre"],
-                "estacion_codigo": pred_estacion["codigo"]
-            }
+            self._cache = self._formatear_estacion(pred_estacion, resultado_multi["fecha_prediccion"])
+            self._cache_ts = ahora
+            return self._cache
+            
+        except Exception as e:
+            logger.exception("❌ Error al obtener predicción")
+            return {"error": str(e)}
+   
+    def obtener_predicciones_estaciones(self, codigos=None):
+        """
+        Obtiene la predicción actual de varias estaciones con una sola llamada al predictor
+        
+        Args:
+            codigos: Lista de códigos de estación (default: todas las disponibles)
             
+        Returns:
+            dict: {codigo: predicción} con el mismo formato que obtener_prediccion_actual
+        """
+        if self.predictor is None:
+            return {"error": "Predictor no disponible"}
+        
+        try:
+            resultado_multi = self.predictor.predecir()
         except Exception as e:
-            logger.error(f"❌ Error al obtener predicción: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error al obtener predicciones")
             return {"error": str(e)}
+        
+        if "error" in resultado_multi:
+            return {"error": resultado_multi["error"]}
+        
+        por_codigo = resultado_multi["predicciones_por_codigo"]
+        if codigos is None:
+            codigos = por_codigo.keys()
+        
+        fecha = resultado_multi["fecha_prediccion"]
+        return {
+            codigo: self._formatear_estacion(por_codigo[codigo], fecha)
+            for codigo in codigos if codigo in por_codigo
+        }
+    
+    @staticmethod
+    def _formatear_estacion(pred_estacion, fecha_prediccion):
+        """Respuesta de una estación en el formato que usan los mensajes del bot"""
+        return {
+            "temperatura_predicha": pred_estacion["temperatura_predicha"],
+            "probabilidad_helada": pred_estacion["probabilidad_helada"],
+            "riesgo": pred_estacion["riesgo"],
+            "emoji_riesgo": pred_estacion["emoji_riesgo"],
+            "fecha_prediccion": fecha_prediccion,
+            "estacion_nombre": pred_estacion["nombre"],
+            "estacion_codigo": pred_estacion["codigo"]
+        }
    
     def necesita_enviar_alerta(self, prediccion):
         """
@@ -125,14 +361,45 @@ class NotificadorHeladas:
         if "error" in prediccion:
             return False, None
        
-        temp = prediccion['temperatura_predicha']
-       
-        if temp <= UMBRALES['alto']: # <= 0°C
-            return True, "ALTO"
-        elif temp <= UMBRALES['medio']: # <= 2°C
-            return True, "MEDIO"
-        else:
-            return False, None
+        return _decidir_alerta(prediccion['temperatura_predicha'])
+   
+    @staticmethod
+    def clave_alerta(prediccion):
+        """
+        Clave que identifica una alerta: fecha, riesgo y temperatura redondeada
+        
+        Args:
+            prediccion: dict con datos de predicción
+            
+        Returns:
+            str: clave de la alerta
+        """
+        return f"{prediccion['fecha_prediccion']}|{prediccion['riesgo']}|{prediccion['temperatura_predicha']:.1f}"
+   
+    def alerta_es_nueva(self, prediccion):
+        """
+        Indica si la alerta difiere de la última enviada
+        
+        Args:
+            prediccion: dict con datos de predicción
+            
+        Returns:
+            bool: True si la alerta no se había enviado todavía
+        """
+        return self.clave_alerta(prediccion) != self.ultima_alerta
+   
+    def marcar_alerta_enviada(self, prediccion):
+        """
+        Recuerda la alerta como enviada (llamar solo tras completar el envío)
+        
+        Args:
+            prediccion: dict con datos de predicción
+            
+        Returns:
+            str: clave de la alerta
+        """
+        self.ultima_alerta = self.clave_alerta(prediccion)
+        return self.ultima_alerta
    
     def formatear_mensaje_alerta(self, prediccion):
         """
@@ -150,35 +417,11 @@ class NotificadorHeladas:
         emoji = prediccion['emoji_riesgo']
         fecha = prediccion['fecha_prediccion']
        
-        # Convertir fecha a texto legible
-        meses_es = {
-            1: 'enero', 2: 'febrero', 3: 'marzo', 4: 'abril',
-            5: 'mayo', 6: 'junio', 7: 'julio', 8: 'agosto',
-            9: 'septiembre', 10: 'octubre', 11: 'noviembre', 12: 'diciembre'
-        }
-       
-        if hasattr(fecha, 'day'):
-            dia = fecha.day
-            mes = meses_es[fecha.month]
-            anio = fecha.year
-        else:
-            # Si fecha es un datetime.date
-            dia = fecha.day
-            mes = meses_es[fecha.month]
-            anio = fecha.year
-        
-        fecha_texto = f"{dia} de {mes} de {anio}"
+        fecha_texto = _formatear_fecha(fecha)
        
-        mensaje = f"""
-{emoji} **ALERTA DE HELADA**
-📍 **Madrid, Cundinamarca**
-📅 **Fecha**: {fecha_texto}
-🌡️ **Temperatura predicha**: {temp:.1f}°C
-❄️ **Probabilidad de helada**: {prob:.1f}%
-🔎 **Nivel de riesgo**: {riesgo}
-"""
-       
-        return mensaje
+        return _renderizar_alerta(
+            emoji=emoji, fecha=fecha_texto, temp=temp, prob=prob, riesgo=riesgo
+        )
    
     def formatear_mensaje_prediccion(self, prediccion):
         """
@@ -199,35 +442,12 @@ class NotificadorHeladas:
         emoji = prediccion['emoji_riesgo']
         fecha = prediccion['fecha_prediccion']
        
-        # Convertir fecha
-        meses_es = {
-            1: 'enero', 2: 'febrero', 3: 'marzo', 4: 'abril',
-            5: 'mayo', 6: 'junio', 7: 'julio', 8: 'agosto',
-            9: 'septiembre', 10: 'octubre', 11: 'noviembre', 12: 'diciembre'
-        }
-       
-        if hasattr(fecha, 'day'):
-            dia = fecha.day
-            mes = meses_es[fecha.month]
-            anio = fecha.year
-        else:
-            dia = fecha.day
-            mes = meses_es[fecha.month]
-            anio = fecha.year
-            
-        fecha_texto = f"{dia} de {mes} de {anio}"
-       
-        mensaje = f"""
-{emoji} Predicción de Heladas para Madrid, Cundinamarca
-📅 Mañana: {fecha_texto}
-🌡️ Temperatura Mínima predicha: {temp:.1f}°C
-❄️ Probabilidad de helada: {prob:.1f}%
-🔎 Nivel de riesgo: {riesgo}
-
-🕐 Actualizado: {datetime.now().strftime('%H:%M:%S')}
-"""
+        fecha_texto = _formatear_fecha(fecha)
        
-        return mensaje
+        return _renderizar_prediccion(
+            emoji=emoji, fecha=fecha_texto, temp=temp, prob=prob, riesgo=riesgo,
+            hora=datetime.now().strftime('%H:%M:%S')
+        )
    
     def generar_resumen_diario(self, prediccion):
         """
@@ -8,23 +8,19 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 from datetime import datetime
 
-from database import DatabaseManager
+from database import DatabaseManager, DatabaseManagerAsync
 from notificador import NotificadorHeladas
-from config import TELEGRAM_BOT_TOKEN, MENSAJES, DB_PATH
+from config import (
+    TELEGRAM_BOT_TOKEN, MENSAJES, DB_PATH, WEBHOOK_URL, WEBHOOK_PORT, POLLING_TIMEOUT,
+    configurar_logging
+)
 
 # Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('logs_alertas.txt'),
-        logging.StreamHandler()
-    ]
-)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
 # Inicializar componentes
-db = DatabaseManager(DB_PATH)
+db = DatabaseManagerAsync(DatabaseManager(DB_PATH))
 notificador = NotificadorHeladas()
 
 
@@ -37,13 +33,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     # Verificar si ya está suscrito
-    if db.esta_suscrito(chat_id):
+    if await db.esta_suscrito(chat_id):
         await update.message.reply_text(MENSAJES['ya_suscrito'])
         logger.info(f"Usuario ya suscrito intentó /start: {chat_id}")
         return
     
     # Agregar suscriptor (SIN datos personales para privacidad)
-    if db.agregar_suscriptor(chat_id):
+    if await db.agregar_suscriptor(chat_id):
         await update.message.reply_text(MENSAJES['bienvenida'])
         await update.message.reply_text(MENSAJES['suscripcion_exitosa'])
         logger.info(f"✅ Nuevo suscriptor: {chat_id}")
@@ -56,11 +52,11 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /stop - Pausar alertas"""
     chat_id = update.effective_chat.id
     
-    if not db.esta_suscrito(chat_id):
+    if not await db.esta_suscrito(chat_id):
         await update.message.reply_text(MENSAJES['no_suscrito'])
         return
     
-    if db.actualizar_estado_suscripcion(chat_id, False):
+    if await db.actualizar_estado_suscripcion(chat_id, False):
         await update.message.reply_text(MENSAJES['pausado'])
         logger.info(f"⏸️ Usuario pausado: {chat_id}")
     else:
@@ -71,12 +67,12 @@ async def reanudar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /reanudar - Reactivar alertas"""
     chat_id = update.effective_chat.id
     
-    info = db.obtener_info_suscriptor(chat_id)
+    info = await db.obtener_info_suscriptor(chat_id)
     if not info:
         await update.message.reply_text(MENSAJES['no_suscrito'])
         return
     
-    if db.actualizar_estado_suscripcion(chat_id, True):
+    if await db.actualizar_estado_suscripcion(chat_id, True):
         await update.message.reply_text(MENSAJES['reanudado'])
         logger.info(f"▶️ Usuario reactivado: {chat_id}")
     else:
@@ -87,7 +83,7 @@ async def estado(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /estado - Ver estado de suscripción"""
     chat_id = update.effective_chat.id
     
-    info = db.obtener_info_suscriptor(chat_id)
+    info = await db.obtener_info_suscriptor(chat_id)
     
     if not info:
         await update.message.reply_text(MENSAJES['no_suscrito'])
@@ -118,8 +114,9 @@ async def prediccion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mensaje_espera = await update.message.reply_text("🔮 Generando predicción, espera un momento...")
     
     try:
-        # Obtener predicción actual
-        resultado = notificador.obtener_prediccion_actual()
+        # Obtener predicción actual (de la caché, o calculada en un hilo
+        # compartido con las demás consultas simultáneas)
+        resultado = await notificador.obtener_prediccion_actual_async()
         
         if "error" in resultado:
             await mensaje_espera.edit_text(f"❌ Error: {resultado['error']}")
@@ -158,7 +155,7 @@ async def estadisticas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # if chat_id not in ADMINS:
     #     return
     
-    stats = db.obtener_estadisticas()
+    stats = await db.obtener_estadisticas()
     
     mensaje = f"""
 📊 **Estadísticas del Sistema**
@@ -188,6 +185,30 @@ async def estadisticas(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # INICIALIZACIÓN DEL BOT
 # ============================================================
 
+async def precalentar_predictor():
+    """Carga el predictor y calcula la predicción del día fuera del event loop"""
+    resultado = await notificador.obtener_prediccion_actual_async()
+    if "error" in resultado:
+        logger.warning(f"⚠️ No se pudo precalentar el predictor: {resultado['error']}")
+    else:
+        logger.info("🔥 Predictor precalentado")
+
+
+async def post_init(application: Application):
+    """
+    Se ejecuta una vez al arrancar el bot
+    
+    El precalentamiento corre en segundo plano: el bot ya atiende comandos
+    mientras tanto, y un /prediccion que llegue antes comparte el mismo cálculo.
+    """
+    application.create_task(precalentar_predictor())
+
+
+async def post_shutdown(application: Application):
+    """Se ejecuta al detener el bot: confirma las escrituras pendientes y cierra la base"""
+    await db.cerrar()
+
+
 def iniciar_bot():
     """Inicializa y ejecuta el bot de Telegram"""
     
@@ -197,7 +218,7 @@ def iniciar_bot():
     logger.info("=" * 60)
     
     # Crear aplicación
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     
     # Registrar comandos
     application.add_handler(CommandHandler("start", start))
@@ -214,7 +235,24 @@ def iniciar_bot():
     logger.info("=" * 60)
     
     # Iniciar bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        # Telegram entrega cada actualización por HTTP: sin consultas periódicas
+        logger.info(f"🌐 Modo webhook en el puerto {WEBHOOK_PORT}")
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=TELEGRAM_BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TELEGRAM_BOT_TOKEN}",
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        # Long polling: cada getUpdates queda abierto hasta POLLING_TIMEOUT
+        # segundos, así que sin tráfico apenas se hacen peticiones
+        application.run_polling(
+            allowed_updates=Update.ALL_TYPES,
+            poll_interval=0.0,
+            timeout=POLLING_TIMEOUT
+        )
 
 
 if __name__ == '__main__':
@@ -3,6 +3,7 @@ Script de prueba completo para verificar todos los componentes del sistema
 Ejecuta: python test_completo.py
 """
 
+import os
 import sys
 from pathlib import Path
 
@@ -18,6 +19,14 @@ def print_seccion(numero, titulo):
     print(f"  {numero}. {titulo}")
     print(f"{'─' * 70}")
 
+def listar_archivos(carpeta):
+    """Archivos de una carpeta y su tamaño en bytes, con un solo recorrido (vacío si no existe)"""
+    try:
+        with os.scandir(carpeta) as entradas:
+            return {e.name: e.stat().st_size for e in entradas if e.is_file()}
+    except FileNotFoundError:
+        return {}
+
 # ============================================================
 # INICIO
 # ============================================================
@@ -44,8 +53,10 @@ archivos_principales = {
     '.env': 'Variables de entorno'
 }
 
+archivos_presentes = listar_archivos('.')
+
 for archivo, descripcion in archivos_principales.items():
-    if Path(archivo).exists():
+    if archivo in archivos_presentes:
         print(f"  ✅ {archivo:<25} - {descripcion}")
     else:
         print(f"  ❌ {archivo:<25} - NO ENCONTRADO")
@@ -154,6 +165,7 @@ try:
     print("  ✅ Actualizar estado: OK")
     
     # Limpiar
+    db_test.cerrar()
     Path('test_db.db').unlink(missing_ok=True)
     print("  ✅ Limpieza de BD de prueba: OK")
     
@@ -254,11 +266,13 @@ modelos_necesarios = [
     'features_helada.pkl'
 ]
 
+modelos_presentes = listar_archivos(modelos_dir)
+
 modelos_ok = True
 for modelo in modelos_necesarios:
-    ruta = modelos_dir / modelo
-    if ruta.exists():
-        size_kb = ruta.stat().st_size / 1024
+    size = modelos_presentes.get(modelo)
+    if size is not None:
+        size_kb = size / 1024
         print(f"  ✅ {modelo:<35} ({size_kb:.1f} KB)")
     else:
         print(f"  ❌ {modelo:<35} - NO ENCONTRADO")
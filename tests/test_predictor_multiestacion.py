@@ -0,0 +1,49 @@
+"""
+Pruebas del predictor multi-estación ante fallos de un grupo de modelos
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+import predictor_multiestacion as pm
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    return pm.PredictorHeladasMulti()
+
+
+def test_grupo_con_error_no_descarta_las_demas_estaciones(predictor, monkeypatch):
+    """Si el modelo unificado falla, la estación de Madrid sigue prediciéndose"""
+    evaluar = pm._evaluar
+    
+    def evaluar_con_fallo(modelos, tipo, X):
+        if modelos is predictor._modelos['unificado']:
+            raise ValueError("modelo unificado roto")
+        return evaluar(modelos, tipo, X)
+    
+    monkeypatch.setattr(pm, "_evaluar", evaluar_con_fallo)
+    resultado = predictor.predecir(forzar_recalculo=True)
+    
+    assert "error" not in resultado
+    assert set(resultado["predicciones_por_codigo"]) == {pm.CODIGO_MADRID}
+
+
+def test_fallo_del_lote_se_reintenta_por_estacion(predictor, monkeypatch):
+    """Si solo falla la evaluación en lote, las estaciones se evalúan una a una"""
+    completo = predictor.predecir(forzar_recalculo=True)
+    evaluar = pm._evaluar
+    
+    def evaluar_sin_lotes(modelos, tipo, X):
+        if len(X) > 1:
+            raise ValueError("lote rechazado")
+        return evaluar(modelos, tipo, X)
+    
+    monkeypatch.setattr(pm, "_evaluar", evaluar_sin_lotes)
+    resultado = predictor.predecir(forzar_recalculo=True)
+    
+    assert resultado["predicciones_por_codigo"] == completo["predicciones_por_codigo"]
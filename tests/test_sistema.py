@@ -2,7 +2,9 @@
 Script de prueba para verificar que todos los componentes funcionen
 """
 
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 print("=" * 60)
@@ -30,20 +32,25 @@ carpetas_necesarias = [
 
 todo_ok = True
 
+# El reporte de cada sección se escribe de una vez
+lineas = []
+
 for archivo in archivos_necesarios:
-    if Path(archivo).exists():
-        print(f"  ✅ {archivo}")
+    if os.access(archivo, os.F_OK):
+        lineas.append(f"  ✅ {archivo}")
     else:
-        print(f"  ❌ {archivo} - NO ENCONTRADO")
+        lineas.append(f"  ❌ {archivo} - NO ENCONTRADO")
         todo_ok = False
 
 for carpeta in carpetas_necesarias:
-    if Path(carpeta).exists():
-        print(f"  ✅ {carpeta}/")
+    if os.access(carpeta, os.F_OK):
+        lineas.append(f"  ✅ {carpeta}/")
     else:
-        print(f"  ❌ {carpeta}/ - NO ENCONTRADA")
+        lineas.append(f"  ❌ {carpeta}/ - NO ENCONTRADA")
         todo_ok = False
 
+print("\n".join(lineas))
+
 if not todo_ok:
     print("\n⚠️ Faltan archivos o carpetas necesarios")
     sys.exit(1)
@@ -97,109 +104,153 @@ except Exception as e:
     print(f"  ❌ Error al importar config.py: {e}")
     todo_ok = False
 
+# Las secciones 4 a 7 son independientes entre sí: se ejecutan en paralelo
+# y cada una devuelve (ok, líneas) para imprimir su reporte en orden
+
 # ============================================================
 # 4. PROBAR BASE DE DATOS
 # ============================================================
-print("\n💾 4. Probando base de datos...")
-
-try:
-    from database import DatabaseManager
-    
-    db = DatabaseManager('test_suscriptores.db')
-    print("  ✅ Base de datos inicializada")
+def probar_base_datos():
+    lineas = ["\n💾 4. Probando base de datos..."]
     
-    # Probar operaciones básicas
-    db.agregar_suscriptor(12345, "test_user", "Test User")
-    print("  ✅ Agregar suscriptor funciona")
-    
-    esta_suscrito = db.esta_suscrito(12345)
-    if esta_suscrito:
-        print("  ✅ Verificar suscripción funciona")
-    
-    stats = db.obtener_estadisticas()
-    print(f"  ✅ Estadísticas: {stats['total_suscriptores']} suscriptores")
-    
-    # Limpiar BD de prueba
-    Path('test_suscriptores.db').unlink(missing_ok=True)
-    print("  ✅ Base de datos de prueba eliminada")
+    try:
+        from database import DatabaseManager
+        
+        # Con TESTING definido la prueba no toca el disco (base en memoria)
+        db_path = ':memory:' if os.environ.get('TESTING') else 'test_suscriptores.db'
+        db = DatabaseManager(db_path)
+        lineas.append("  ✅ Base de datos inicializada")
+        
+        # Probar operaciones básicas
+        db.agregar_suscriptor(12345, "test_user", "Test User")
+        lineas.append("  ✅ Agregar suscriptor funciona")
+        
+        esta_suscrito = db.esta_suscrito(12345)
+        if esta_suscrito:
+            lineas.append("  ✅ Verificar suscripción funciona")
+        
+        stats = db.obtener_estadisticas()
+        lineas.append(f"  ✅ Estadísticas: {stats['total_suscriptores']} suscriptores")
+        
+        # Limpiar BD de prueba
+        db.cerrar()
+        if db_path != ':memory:':
+            Path(db_path).unlink(missing_ok=True)
+        lineas.append("  ✅ Base de datos de prueba eliminada")
+        
+    except Exception as e:
+        lineas.append(f"  ❌ Error en base de datos: {e}")
+        return False, lineas
     
-except Exception as e:
-    print(f"  ❌ Error en base de datos: {e}")
-    todo_ok = False
+    return True, lineas
 
 # ============================================================
 # 5. PROBAR PREDICTOR
 # ============================================================
-print("\n🔮 5. Probando predictor de heladas...")
-
-try:
-    from predictor import PredictorHeladas
-    
-    predictor = PredictorHeladas()
-    print("  ✅ Predictor inicializado")
-    
-    # Hacer predicción de prueba
-    print("  ⏳ Generando predicción de prueba...")
-    resultado = predictor.predecir()
+def probar_predictor():
+    lineas = ["\n🔮 5. Probando predictor de heladas..."]
     
-    if "error" in resultado:
-        print(f"  ❌ Error en predicción: {resultado['error']}")
-        todo_ok = False
-    else:
-        print(f"  ✅ Predicción generada exitosamente")
-        print(f"     • Temperatura: {resultado['temperatura_predicha']:.1f}°C")
-        print(f"     • Probabilidad helada: {resultado['probabilidad_helada']:.1f}%")
-        print(f"     • Riesgo: {resultado['riesgo']}")
-        print(f"     • Fecha predicción: {resultado['fecha_prediccion']}")
+    try:
+        from predictor import PredictorHeladas
+        
+        predictor = PredictorHeladas()
+        lineas.append("  ✅ Predictor inicializado")
+        
+        # Hacer predicción de prueba
+        lineas.append("  ⏳ Generando predicción de prueba...")
+        resultado = predictor.predecir()
+        
+        if "error" in resultado:
+            lineas.append(f"  ❌ Error en predicción: {resultado['error']}")
+            return False, lineas
+        
+        lineas.append(f"  ✅ Predicción generada exitosamente")
+        lineas.append(f"     • Temperatura: {resultado['temperatura_predicha']:.1f}°C")
+        lineas.append(f"     • Probabilidad helada: {resultado['probabilidad_helada']:.1f}%")
+        lineas.append(f"     • Riesgo: {resultado['riesgo']}")
+        lineas.append(f"     • Fecha predicción: {resultado['fecha_prediccion']}")
+        
+    except Exception as e:
+        lineas.append(f"  ❌ Error en predictor: {e}")
+        import traceback
+        lineas.append(traceback.format_exc().rstrip())
+        return False, lineas
     
-except Exception as e:
-    print(f"  ❌ Error en predictor: {e}")
-    import traceback
-    traceback.print_exc()
-    todo_ok = False
+    return True, lineas
 
 # ============================================================
 # 6. VERIFICAR MODELOS ML
 # ============================================================
-print("\n🤖 6. Verificando modelos de Machine Learning...")
-
-modelos_dir = Path('Datos/modelos_entrenados')
-modelos_necesarios = [
-    'modelo_temperatura_ridge.pkl',
-    'modelo_helada_ridge.pkl',
-    'scaler_temperatura.pkl',
-    'scaler_helada.pkl',
-    'features_temperatura.pkl',
-    'features_helada.pkl'
-]
-
-for modelo in modelos_necesarios:
-    ruta_modelo = modelos_dir / modelo
-    if ruta_modelo.exists():
-        print(f"  ✅ {modelo}")
-    else:
-        print(f"  ❌ {modelo} - NO ENCONTRADO")
-        todo_ok = False
+def verificar_modelos():
+    lineas = ["\n🤖 6. Verificando modelos de Machine Learning..."]
+    
+    modelos_dir = Path('Datos/modelos_entrenados')
+    modelos_necesarios = [
+        'modelo_temperatura_ridge.pkl',
+        'modelo_helada_ridge.pkl',
+        'scaler_temperatura.pkl',
+        'scaler_helada.pkl',
+        'features_temperatura.pkl',
+        'features_helada.pkl'
+    ]
+    
+    # Un solo listado de la carpeta (con el tamaño de cada archivo) en lugar de un stat por modelo
+    try:
+        with os.scandir(modelos_dir) as entradas:
+            modelos_presentes = {e.name: e.stat().st_size for e in entradas if e.is_file()}
+    except FileNotFoundError:
+        modelos_presentes = {}
+    
+    ok = True
+    for modelo in modelos_necesarios:
+        size = modelos_presentes.get(modelo)
+        if size is None:
+            lineas.append(f"  ❌ {modelo} - NO ENCONTRADO")
+            ok = False
+        elif size == 0:
+            lineas.append(f"  ❌ {modelo} - ARCHIVO VACÍO")
+            ok = False
+        else:
+            lineas.append(f"  ✅ {modelo}")
+    
+    return ok, lineas
 
 # ============================================================
 # 7. VERIFICAR DATOS
 # ============================================================
-print("\n📊 7. Verificando datos históricos...")
-
-csv_path = Path('Datos/datos_imputados/cundinamarca_imputado_v1.csv')
-if csv_path.exists():
-    print(f"  ✅ {csv_path}")
+def verificar_datos():
+    lineas = ["\n📊 7. Verificando datos históricos..."]
+    
+    csv_path = Path('Datos/datos_imputados/cundinamarca_imputado_v1.csv')
+    if not os.path.isfile(csv_path):
+        lineas.append(f"  ❌ {csv_path} - NO ENCONTRADO")
+        return False, lineas
+    
+    lineas.append(f"  ✅ {csv_path}")
     
     try:
         import pandas as pd
-        df = pd.read_csv(csv_path)
-        print(f"     • Registros: {len(df)}")
-        print(f"     • Columnas: {len(df.columns)}")
+        # Solo interesa la forma: cabecera + conteo de filas leyendo una columna por bloques
+        columnas = pd.read_csv(csv_path, nrows=0).columns
+        registros = sum(len(bloque) for bloque in pd.read_csv(csv_path, usecols=[0], chunksize=1_000_000))
+        lineas.append(f"     • Registros: {registros}")
+        lineas.append(f"     • Columnas: {len(columnas)}")
     except Exception as e:
-        print(f"  ⚠️ No se pudo leer el CSV: {e}")
-else:
-    print(f"  ❌ {csv_path} - NO ENCONTRADO")
-    todo_ok = False
+        lineas.append(f"  ⚠️ No se pudo leer el CSV: {e}")
+    
+    return True, lineas
+
+
+secciones = [probar_base_datos, probar_predictor, verificar_modelos, verificar_datos]
+
+with ThreadPoolExecutor(max_workers=len(secciones)) as ejecutor:
+    futuros = [ejecutor.submit(seccion) for seccion in secciones]
+
+for futuro in futuros:
+    ok, lineas = futuro.result()
+    print("\n".join(lineas))
+    if not ok:
+        todo_ok = False
 
 # ============================================================
 # RESUMEN FINAL